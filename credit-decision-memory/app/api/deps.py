@@ -1,23 +1,58 @@
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from app.services.qdrant_service import QdrantService
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, build_http_client
 from app.core.feature_engine import FeatureEngine
 from app.core.orchestrator import CreditOrchestrator
+from app.core.feature_cache import FeatureCache
+from app.services.decision_cache import SemanticDecisionCache
 from app.core.config import SETTINGS
 
-# Initialize services as singletons
-qdrant_svc = QdrantService(url=SETTINGS.QDRANT_URL, api_key=SETTINGS.QDRANT_API_KEY)
-llm_svc = LLMService(api_key=SETTINGS.GROQ_API_KEY)
-engine_svc = FeatureEngine(
-    risk_scaler_path="models/risk_scaler.joblib", 
-    fraud_scaler_path="models/fraud_scaler.joblib"
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services are built once per worker at startup (not at import), on the serving event loop
+    engine_svc = FeatureEngine(
+        risk_scaler_path="models/risk_scaler.joblib", 
+        fraud_scaler_path="models/fraud_scaler.joblib"
+    )
+    engine_svc.warmup() # JIT-compile the aggregation kernel before serving
+    groq_http = build_http_client()
+    llm_svc = LLMService(
+        api_key=SETTINGS.GROQ_API_KEY,
+        http_client=groq_http,
+        max_concurrency=SETTINGS.LLM_MAX_CONCURRENCY,
+        requests_per_minute=SETTINGS.LLM_REQUESTS_PER_MINUTE
+    )
+    feature_cache = FeatureCache(maxsize=SETTINGS.FEATURE_CACHE_MAXSIZE, ttl=SETTINGS.FEATURE_CACHE_TTL_SECONDS)
 
-orchestrator = CreditOrchestrator(engine_svc, qdrant_svc, llm_svc)
+    qdrant_svc = QdrantService(url=SETTINGS.QDRANT_URL, api_key=SETTINGS.QDRANT_API_KEY)
+    if not await qdrant_svc.check_health(): # Opens the connection pool before the first request
+        print("Qdrant is unreachable at startup; memory search will return no twins")
+    await qdrant_svc.ensure_quantization()
+    decision_cache = SemanticDecisionCache(
+        qdrant_svc.client,
+        approved_max_distance=SETTINGS.DECISION_CACHE_MAX_DISTANCE,
+        rejected_max_distance=SETTINGS.DECISION_CACHE_REJECTED_MAX_DISTANCE,
+        l1_size=SETTINGS.DECISION_CACHE_L1_SIZE,
+        ttl=SETTINGS.DECISION_CACHE_TTL_SECONDS
+    )
+    await decision_cache.ensure_collection(len(SETTINGS.RISK_VECTOR_FEATURES) + len(SETTINGS.FRAUD_VECTOR_FEATURES))
+    eviction_task = asyncio.create_task(decision_cache.run_eviction(SETTINGS.DECISION_CACHE_EVICT_INTERVAL_SECONDS))
 
-def get_orchestrator():
-    return orchestrator
+    app.state.engine = engine_svc
+    app.state.qdrant = qdrant_svc
+    app.state.orchestrator = CreditOrchestrator(engine_svc, qdrant_svc, llm_svc, feature_cache, decision_cache)
+    yield
+    eviction_task.cancel()
+    await qdrant_svc.close()
+    await llm_svc.client.close()
+    await groq_http.aclose()
+
+def get_orchestrator(request: Request):
+    return request.app.state.orchestrator
 
 def get_density_maps():
     # In a real app, these would come from Redis or a Database
     # For now, we return empty dicts or pre-loaded JSON
-    return {'ip': {}, 'device': {}}
\ No newline at end of file
+    return {'ip': {}, 'device': {}}
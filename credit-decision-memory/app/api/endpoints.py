@@ -1,15 +1,17 @@
+import asyncio
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from app.models.pydantic_models import PipelineRequest, PipelineResponse, ManualReviewAction
+from app.models.pydantic_models import PipelineRequestFast, PipelineResponse, ManualReviewAction
 from app.core.orchestrator import CreditOrchestrator
 from app.api.deps import get_orchestrator, get_density_maps
 from app.services.qdrant_service import QdrantService
-from app.core.feature_engine import FeatureEngine
+from app.core.feature_engine import FeatureEngine, InvalidTransactionsError
 
 router = APIRouter()
 
 @router.post("/analyze", response_model=PipelineResponse)
 async def analyze_application(
-    request: PipelineRequest,
+    request: PipelineRequestFast,
     orchestrator: CreditOrchestrator = Depends(get_orchestrator),
     maps: dict = Depends(get_density_maps)
 ):
@@ -25,13 +27,36 @@ async def analyze_application(
             dev_map=maps['device']
         )
         return result
+    except InvalidTransactionsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pipeline Error: {str(e)}")
+
+@router.post("/decide/batch", response_model=List[PipelineResponse])
+async def analyze_batch(
+    requests: List[PipelineRequestFast],
+    orchestrator: CreditOrchestrator = Depends(get_orchestrator),
+    maps: dict = Depends(get_density_maps)
+):
+    """
+    Bulk variant of /analyze: one AI recommendation per application, same order.
+    LLM calls run concurrently within the configured Groq limits.
+    """
+    try:
+        return await orchestrator.process_batch(
+            requests,
+            ip_map=maps['ip'],
+            dev_map=maps['device']
+        )
+    except InvalidTransactionsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pipeline Error: {str(e)}")
 
 @router.post("/finalize")
 async def finalize_decision(
     action: ManualReviewAction,
-    request_data: PipelineRequest, # We need the data to re-generate vectors for memory
+    request_data: PipelineRequestFast, # We need the data to re-generate vectors for memory
     orchestrator: CreditOrchestrator = Depends(get_orchestrator),
     maps: dict = Depends(get_density_maps)
 ):
@@ -40,11 +65,11 @@ async def finalize_decision(
     Saves the final human decision into Qdrant memory.
     """
     try:
-        # 1. Re-generate the features and vectors
-        feature_set = orchestrator.engine.create_feature_set(
+        # 1. Re-use the features and vectors from /analyze (re-generated on cache miss)
+        feature_set = orchestrator.get_feature_set(
             request_data, 
-            ip_density_map=maps['ip'],      
-            device_density_map=maps['device'] 
+            ip_map=maps['ip'],      
+            dev_map=maps['device'] 
         )
         
         # 2. Update the payload with the Human's final status
@@ -53,23 +78,29 @@ async def finalize_decision(
         payload['human_notes'] = action.notes
         
         # 3. Upsert to both Risk and Fraud collections to "teach" the memory
-        orchestrator.qdrant.add_to_memory(
+        #    (independent, idempotent on application_id -> issued concurrently)
+        upserts = [orchestrator.qdrant.add_to_memory(
             application_id=action.application_id,
             vector=feature_set.risk_vector,
             payload=payload,
             collection_name=orchestrator.qdrant.RISK_COLLECTION
-        )
+        )]
         
         # If the human marked it as fraud, ensure it's in the fraud memory
         if "Fraudulent" in action.final_status:
-            orchestrator.qdrant.add_to_memory(
+            upserts.append(orchestrator.qdrant.add_to_memory(
                 application_id=action.application_id,
                 vector=feature_set.fraud_vector,
                 payload=payload,
                 collection_name=orchestrator.qdrant.FRAUD_COLLECTION
-            )
+            ))
+
+        await asyncio.gather(*upserts)
 
+        orchestrator.cache.invalidate(request_data.application.application_id)
         return {"message": "Memory updated successfully", "application_id": action.application_id}
     
+    except InvalidTransactionsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Memory Update Failed: {str(e)}")
\ No newline at end of file
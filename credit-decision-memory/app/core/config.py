@@ -1,5 +1,5 @@
 import os
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List, Dict
 
 class Settings(BaseSettings):
@@ -14,6 +14,22 @@ class Settings(BaseSettings):
     
     # Vector Configuration
     VECTOR_DISTANCE_METRIC: str = "Cosine"
+
+    # Feature Cache (/analyze -> /finalize reuse)
+    FEATURE_CACHE_MAXSIZE: int = 10_000
+    FEATURE_CACHE_TTL_SECONDS: int = 3600
+
+    # Groq limits (llama-3.3-70b: 30 requests/min on the standard tier)
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_REQUESTS_PER_MINUTE: int = 30
+
+    # Semantic Decision Cache (LLM reuse for near-identical applicants)
+    # Max Euclidean distance between scaled risk + fraud vectors (cosine would ignore magnitude)
+    DECISION_CACHE_MAX_DISTANCE: float = 0.05 # APPROVED decisions
+    DECISION_CACHE_REJECTED_MAX_DISTANCE: float = 0.02 # Stricter: never re-use a rejection loosely
+    DECISION_CACHE_L1_SIZE: int = 1024
+    DECISION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600 # Bank policy is revised weekly
+    DECISION_CACHE_EVICT_INTERVAL_SECONDS: int = 3600
     
     # Feature Engineering Constants
     ESSENTIAL_CATEGORIES: List[str] = ['Utilities', 'Healthcare', 'Groceries', 'Education', 'Fuel']
@@ -54,7 +70,6 @@ class Settings(BaseSettings):
         'income_validation_ratio', 'loan_to_spend_ratio', 'midnight_app_flag'
     ]
 
-    class Config:
-        env_file = ".env"
+    model_config = SettingsConfigDict(env_file=".env")
 
 SETTINGS = Settings()
\ No newline at end of file
@@ -0,0 +1,30 @@
+from typing import Optional
+from cachetools import TTLCache
+from app.models.pydantic_models import PipelineRequestFast
+from app.models.domain_models import ExtractedFeatureSet
+
+class FeatureCache:
+    """
+    Keeps the ExtractedFeatureSet computed during /analyze so /finalize can reuse it.
+    Entries are keyed by application_id and hold the request's application and raw transactions
+    (references, nothing copied or serialized on /analyze). /finalize compares them in full, so a
+    request carrying different data anywhere recomputes instead of reusing stale vectors.
+    """
+    def __init__(self, maxsize: int = 10_000, ttl: int = 3600):
+        self._store = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def put(self, request: PipelineRequestFast, feature_set: ExtractedFeatureSet):
+        self._store[request.application.application_id] = (request.application, request.transactions, feature_set)
+
+    def get(self, request: PipelineRequestFast) -> Optional[ExtractedFeatureSet]:
+        """Cached feature set for this exact request (every transaction compared), or None"""
+        entry = self._store.get(request.application.application_id)
+        if entry is None:
+            return None
+        application, transactions, feature_set = entry
+        if application != request.application or transactions != request.transactions:
+            return None
+        return feature_set
+
+    def invalidate(self, application_id: str):
+        self._store.pop(application_id, None)
@@ -1,16 +1,94 @@
-import pandas as pd
+import re
+from datetime import datetime
+from itertools import repeat
 import numpy as np
-from typing import List, Dict, Any
-from app.models.pydantic_models import PipelineRequest, TransactionInput
+from numba import njit
+from typing import List, Dict, Any, get_args
+from app.models.pydantic_models import PipelineRequestFast, TransactionStatus
 from app.models.domain_models import ExtractedFeatureSet
 import joblib # To load our pre-fitted scalers
 from app.core.config import SETTINGS
 
+# One scan over all notes (lower-cased, NUL-joined): a hit consumes the rest of its note,
+# so the match count is the number of notes containing any keyword.
+SUSPICIOUS_NOTES_RE = re.compile(r'(?:test|refund|verify|cash)[^\x00]*')
+NOTES_SEPARATOR = '\x00'
+
+# Small integer codes for the transaction status (derived from the Literal schema).
+# Rows are not validated on the hot path, so unknown values map to UNKNOWN_CODE.
+UNKNOWN_CODE = 255
+STATUS_CODES: Dict[str, int] = {s: i for i, s in enumerate(get_args(TransactionStatus))}
+
+# merchant_category collapses to the spend group the features actually need
+SPEND_OTHER, SPEND_ESSENTIAL, SPEND_LIFESTYLE, SPEND_DEBT, SPEND_CASH = 0, 1, 2, 3, 4
+
+# Ordinal encodings of the application's categorical fields
+GENDER_VALUES: Dict[str, float] = {'Male': 0, 'Female': 1, 'Other': 0.5}
+PROPERTY_VALUES: Dict[str, float] = {'Rented': 0, 'Jointly Owned': 0.5, 'Owned': 1}
+
+@njit(cache=True)
+def _compute_aggregates(amounts, balances, intl, spend_groups, status_codes, failed_code):
+    """
+    Numeric core of the transactional features (n >= 1), fused into one pass over the rows.
+    Balance variance uses Welford's update, so no second pass over the column is needed.
+    """
+    n = amounts.size
+    total = 0.0
+    max_amount = -np.inf
+    bal_mean = 0.0
+    bal_m2 = 0.0
+    bal_min = np.inf
+    essential = 0.0
+    lifestyle = 0.0
+    debt = 0.0
+    cash = 0.0
+    intl_count = 0
+    failed_count = 0
+
+    for i in range(n):
+        amount = amounts[i]
+        total += amount
+        if amount > max_amount:
+            max_amount = amount
+
+        bal = balances[i]
+        delta = bal - bal_mean
+        bal_mean += delta / (i + 1)
+        bal_m2 += delta * (bal - bal_mean)
+        if bal < bal_min:
+            bal_min = bal
+
+        group = spend_groups[i]
+        if group == SPEND_ESSENTIAL:
+            essential += amount
+        elif group == SPEND_LIFESTYLE:
+            lifestyle += amount
+        elif group == SPEND_DEBT:
+            debt += amount
+        elif group == SPEND_CASH:
+            cash += amount
+
+        intl_count += intl[i]
+        if status_codes[i] == failed_code:
+            failed_count += 1
+
+    bal_std = np.sqrt(bal_m2 / (n - 1)) if n > 1 else np.nan
+    return (total, total / n, max_amount, bal_mean, bal_std, bal_min,
+            essential, lifestyle, debt, cash, intl_count, failed_count)
+
+class InvalidTransactionsError(ValueError):
+    """Raw transaction rows that are missing fields or carry values of the wrong type"""
+
 class FeatureEngine:
     def __init__(self, risk_scaler_path: str, fraud_scaler_path: str):
         # Load the scalers we saved during the training phase
-        self.risk_scaler = joblib.load(risk_scaler_path)
-        self.fraud_scaler = joblib.load(fraud_scaler_path)
+        # Memory-mapped: fitted arrays are paged in on demand and shared across workers
+        self.risk_scaler = joblib.load(risk_scaler_path, mmap_mode='r')
+        self.fraud_scaler = joblib.load(fraud_scaler_path, mmap_mode='r')
+
+        # Scalers reduced to (offset, inv_scale) so scaling is one NumPy expression
+        self._risk_offset, self._risk_inv_scale = self._affine_params(self.risk_scaler)
+        self._fraud_offset, self._fraud_inv_scale = self._affine_params(self.fraud_scaler)
         
         # Define the strict order of features for the vectors
         # (Must match the order used during Qdrant collection setup)
@@ -18,21 +96,48 @@ class FeatureEngine:
 
         self.fraud_feature_order = SETTINGS.FRAUD_VECTOR_FEATURES
 
-    def create_feature_set(self, request: PipelineRequest, ip_density_map: Dict, device_density_map: Dict) -> ExtractedFeatureSet:
+        # Both vectors are gathered from one array holding the union of their features
+        self._vector_features = list(dict.fromkeys(self.risk_feature_order + self.fraud_feature_order))
+        self._feature_idx = {name: i for i, name in enumerate(self._vector_features)}
+        self._risk_idx = np.array([self._feature_idx[f] for f in self.risk_feature_order], dtype=np.intp)
+        self._fraud_idx = np.array([self._feature_idx[f] for f in self.fraud_feature_order], dtype=np.intp)
+
+        # Category vocabularies, resolved once into a category -> spend group map
+        self._essential = frozenset(SETTINGS.ESSENTIAL_CATEGORIES)
+        self._lifestyle = frozenset(SETTINGS.LIFESTYLE_CATEGORIES)
+        self._spend_group = {'Financial Services': SPEND_DEBT, 'Cash Withdrawal': SPEND_CASH}
+        self._spend_group.update({c: SPEND_LIFESTYLE for c in self._lifestyle})
+        self._spend_group.update({c: SPEND_ESSENTIAL for c in self._essential})
+
+        # Risk maps resolved once (no per-request SETTINGS lookups or dict literals)
+        self._employment_risk = dict(SETTINGS.EMPLOYMENT_RISK_MAP)
+        self._loan_type_risk = dict(SETTINGS.LOAN_TYPE_RISK_MAP)
+
+    def warmup(self):
+        """Compiles the aggregation kernel so the first request doesn't pay for it"""
+        one_f = np.zeros(1, dtype=np.float64)
+        one_code = np.zeros(1, dtype=np.uint8)
+        _compute_aggregates(one_f, one_f, np.zeros(1, dtype=np.int64), one_code, one_code, STATUS_CODES['Failed'])
+
+    def create_feature_set(self, request: PipelineRequestFast, ip_density_map: Dict, device_density_map: Dict) -> ExtractedFeatureSet:
         """
-        Main entry point: PipelineRequest -> ExtractedFeatureSet
+        Main entry point: PipelineRequestFast -> ExtractedFeatureSet
         """
-        # 1. Convert to DataFrames
-        loan_data = request.application.dict()
-        tx_list = [tx.dict() for tx in request.transactions]
-        tx_df = pd.DataFrame(tx_list)
-        
-        # 2. Extract Features
-        all_features = self._run_engineering(loan_data, tx_df, ip_density_map, device_density_map)
+        # 1. Convert to column arrays
+        loan_data = request.application.model_dump()
+        # Rows skipped schema validation, so a bad one surfaces here as a lookup/conversion error
+        try:
+            tx_columns = self._extract_columns(request.transactions)
+            
+            # 2. Extract Features
+            all_features = self._run_engineering(loan_data, tx_columns, ip_density_map, device_density_map)
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidTransactionsError(f"Invalid transactions: {type(e).__name__}: {e}") from e
         
         # 3. Generate Scaled Vectors
-        risk_vec = self._generate_vector(all_features, self.risk_feature_order, self.risk_scaler)
-        fraud_vec = self._generate_vector(all_features, self.fraud_feature_order, self.fraud_scaler)
+        values = self._gather_vector_features(all_features)
+        risk_vec = self._generate_vector(values, self._risk_idx, self._risk_offset, self._risk_inv_scale)
+        fraud_vec = self._generate_vector(values, self._fraud_idx, self._fraud_offset, self._fraud_inv_scale)
         
         return ExtractedFeatureSet(
             application_id=request.application.application_id,
@@ -42,58 +147,95 @@ class FeatureEngine:
             fraud_vector=fraud_vec
         )
 
-    def _run_engineering(self, loan: Dict, tx_df: pd.DataFrame, ip_map: Dict, dev_map: Dict) -> Dict[str, Any]:
+    def _extract_columns(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Single pass over the raw transaction rows, transposed into one array/list per column"""
+        amounts, balances, intl = [], [], []
+        dates, spend_groups, statuses, notes = [], [], [], []
+        devices, ips, locations, destinations = [], [], [], []
+        spend_group = self._spend_group
+        for tx in transactions:
+            amounts.append(tx['transaction_amount'])
+            balances.append(tx['account_balance_after_transaction'])
+            intl.append(tx['is_international_transaction'])
+            dates.append(tx['transaction_date'])
+            spend_groups.append(spend_group.get(tx['merchant_category'], SPEND_OTHER))
+            statuses.append(STATUS_CODES.get(tx['transaction_status'], UNKNOWN_CODE))
+            notes.append(tx['transaction_notes'])
+            devices.append(tx['device_used'])
+            ips.append(tx['ip_address'])
+            locations.append(tx['transaction_location'])
+            destinations.append(tx['transaction_source_destination'])
+
+        # fromiter only takes scalars, so a nested value can't reach the kernel as a 2-D array
+        n = len(amounts)
+        return {
+            'amounts': np.fromiter(amounts, dtype=np.float64, count=n),
+            'balances': np.fromiter(balances, dtype=np.float64, count=n),
+            'intl': np.fromiter(intl, dtype=np.int64, count=n),
+            'spend_groups': np.array(spend_groups, dtype=np.uint8),
+            'status_codes': np.array(statuses, dtype=np.uint8),
+            'dates': dates,
+            'notes': notes,
+            'devices': devices,
+            'ips': ips,
+            'locations': locations,
+            'destinations': destinations,
+        }
+
+    def _run_engineering(self, loan: Dict, tx: Dict[str, Any], ip_map: Dict, dev_map: Dict) -> Dict[str, Any]:
         """The actual logic for all 50+ features"""
-        d = loan.copy()
+        d = loan # Fresh dict from model_dump(), extended in place
+        n = len(tx['amounts'])
+        essential_val = 0
         
         # --- Transactional Aggregates ---
-        if not tx_df.empty:
-            tx_df['transaction_date'] = pd.to_datetime(tx_df['transaction_date'])
-            total_spent = tx_df['transaction_amount'].sum()
-            avg_tx = tx_df['transaction_amount'].mean()
-            total_months = max(tx_df['transaction_date'].dt.to_period('M').nunique(), 1)
-
-            # Category Logic
-            essential_cats = ['Utilities', 'Healthcare', 'Groceries', 'Education', 'Fuel']
-            lifestyle_cats = ['Dining', 'Travel', 'Entertainment', 'Online Shopping', 'Electronics']
-            
-            essential_val = tx_df[tx_df['merchant_category'].isin(essential_cats)]['transaction_amount'].sum()
-            lifestyle_val = tx_df[tx_df['merchant_category'].isin(lifestyle_cats)]['transaction_amount'].sum()
-            debt_val = tx_df[tx_df['merchant_category'] == 'Financial Services']['transaction_amount'].sum()
-            cash_val = tx_df[tx_df['merchant_category'] == 'Cash Withdrawal']['transaction_amount'].sum()
+        if n > 0:
+            (total_spent, avg_tx, max_tx, bal_mean, bal_std, bal_min,
+             essential_val, lifestyle_val, debt_val, cash_val,
+             intl_count, failed_count) = _compute_aggregates(
+                tx['amounts'], tx['balances'], tx['intl'], tx['spend_groups'], tx['status_codes'],
+                STATUS_CODES['Failed']
+            )
+            months = np.array(tx['dates'], dtype='datetime64[M]')
+            total_months = max(len(np.unique(months[~np.isnat(months)])), 1) # Missing dates (NaT) span no month
+            unique_ips = len(set(tx['ips']))
+            unique_devices = len(set(tx['devices']))
 
             # Risk Engineered
-            d['avg_monthly_balance'] = tx_df['account_balance_after_transaction'].mean()
-            d['balance_volatility'] = tx_df['account_balance_after_transaction'].std()
+            d['avg_monthly_balance'] = bal_mean
+            d['balance_volatility'] = bal_std
             d['total_monthly_burn_rate'] = total_spent / total_months
             d['essential_spending_ratio'] = essential_val / (total_spent + 1)
             d['lifestyle_spending_ratio'] = lifestyle_val / (total_spent + 1)
-            d['transaction_frequency'] = len(tx_df) / total_months
-            d['international_tx_indicator'] = tx_df['is_international_transaction'].sum()
-            d['device_diversity_score'] = tx_df['device_used'].nunique()
-            d['ip_stability_ratio'] = (tx_df['ip_address'].nunique()) / (d['transaction_frequency'] + 0.0001)
+            d['transaction_frequency'] = n / total_months
+            d['international_tx_indicator'] = intl_count
+            d['device_diversity_score'] = unique_devices
+            d['ip_stability_ratio'] = unique_ips / (d['transaction_frequency'] + 0.0001)
             d['debt_indicator_ratio'] = debt_val / (total_spent + 1)
             d['cash_dependence_ratio'] = cash_val / (total_spent + 1)
-            d['min_balance_reached'] = tx_df['account_balance_after_transaction'].min()
-            d['max_transaction_value'] = tx_df['transaction_amount'].max()
-            d['avg_transaction_value'] = tx_df['transaction_amount'].mean()
+            d['min_balance_reached'] = bal_min
+            d['max_transaction_value'] = max_tx
+            d['avg_transaction_value'] = avg_tx
             
             # Fraud Engineered
+            ip_scores = [ip_map[ip] for ip in set(tx['ips']) if ip in ip_map]
+            dev_scores = [dev_map[dev] for dev in set(tx['devices']) if dev in dev_map]
+
             d['avg_tx_amount'] = avg_tx
-            d['max_tx_amount'] = tx_df['transaction_amount'].max()
-            d['intl_tx_count'] = tx_df['is_international_transaction'].sum()
-            d['unique_locations'] = tx_df['transaction_location'].nunique()
-            d['unique_ips'] = tx_df['ip_address'].nunique()
-            d['unique_devices'] = tx_df['device_used'].nunique()
-            d['unique_destinations'] = tx_df['transaction_source_destination'].nunique()
+            d['max_tx_amount'] = max_tx
+            d['intl_tx_count'] = intl_count
+            d['unique_locations'] = len(set(tx['locations']))
+            d['unique_ips'] = unique_ips
+            d['unique_devices'] = unique_devices
+            d['unique_destinations'] = len(set(tx['destinations']))
             d['financial_service_spend'] = debt_val
-            d['max_ip_sharing_score'] = tx_df['ip_address'].map(ip_map).max() if ip_map else 1
-            d['max_device_sharing_score'] = tx_df['device_used'].map(dev_map).max() if dev_map else 1
-            d['suspicious_notes_count'] = tx_df['transaction_notes'].str.contains('Test|Refund|Verify|Cash', case=False).sum()
-            d['failed_ratio'] = (tx_df['transaction_status'] == 'Failed').sum() / (len(tx_df) + 1)
-            d['mule_indicator_ratio'] = d['unique_destinations'] / (len(tx_df) + 1)
-            d['intl_tx_ratio'] = d['intl_tx_count'] / (len(tx_df) + 1)
-            d['avg_tx_velocity'] = len(tx_df) / 30
+            d['max_ip_sharing_score'] = (max(ip_scores) if ip_scores else np.nan) if ip_map else 1
+            d['max_device_sharing_score'] = (max(dev_scores) if dev_scores else np.nan) if dev_map else 1
+            d['suspicious_notes_count'] = len(SUSPICIOUS_NOTES_RE.findall(NOTES_SEPARATOR.join(tx['notes']).lower()))
+            d['failed_ratio'] = failed_count / (n + 1)
+            d['mule_indicator_ratio'] = d['unique_destinations'] / (n + 1)
+            d['intl_tx_ratio'] = d['intl_tx_count'] / (n + 1)
+            d['avg_tx_velocity'] = n / 30
             d['income_validation_ratio'] = d['monthly_income'] / (avg_tx + 1)
             d['loan_to_spend_ratio'] = d['loan_amount_requested'] / (total_spent + 1)
         else:
@@ -112,29 +254,48 @@ class FeatureEngine:
         d['age_at_loan_end'] = d['applicant_age'] + (d['loan_tenure_months'] / 12)
         d['income_per_dependent'] = d['monthly_income'] / (d['number_of_dependents'] + 1)
         d['cash_flow_coverage_ratio'] = d.get('avg_monthly_balance', 0) / (d.get('total_monthly_burn_rate', 0) + 1)
-        d['payment_to_income_reality_check'] = (essential_val if 'essential_val' in locals() else 0) / (d['monthly_income'] + 1)
+        d['payment_to_income_reality_check'] = essential_val / (d['monthly_income'] + 1)
         d['income_stability_proxy'] = d.get('balance_volatility', 0) / (d.get('avg_monthly_balance', 0) + 1)
 
         # --- Encoding ---
-        d['gender_val'] = {'Male': 0, 'Female': 1, 'Other': 0.5}.get(d['gender'], 0)
-        d['property_val'] = {'Rented': 0, 'Jointly Owned': 0.5, 'Owned': 1}.get(d['property_ownership_status'], 0)
-        d['cibil_category_val'] = 0 if d['cibil_score'] <= 600 else 0.33 if d['cibil_score'] <= 700 else 0.66 if d['cibil_score'] <= 800 else 1.0
-        d['employment_risk_val'] = {'Salaried': 0.2, 'Business Owner': 0.4, 'Self-Employed': 0.6, 'Student': 0.8, 'Unemployed': 1.0, 'Retired': 0.1}.get(d['employment_status'], 0.5)
-        d['loan_type_risk_val'] = {'Home Loan': 0.1, 'Car Loan': 0.2, 'Education Loan': 0.4, 'Business Loan': 0.7, 'Personal Loan': 0.9}.get(d['loan_type'], 0.5)
-        d['midnight_app_flag'] = 1 if 0 <= pd.to_datetime(d['application_date']).hour <= 5 else 0
+        cibil = d['cibil_score']
+        d['gender_val'] = GENDER_VALUES.get(d['gender'], 0)
+        d['property_val'] = PROPERTY_VALUES.get(d['property_ownership_status'], 0)
+        d['cibil_category_val'] = 0 if cibil <= 600 else 0.33 if cibil <= 700 else 0.66 if cibil <= 800 else 1.0
+        d['employment_risk_val'] = self._employment_risk.get(d['employment_status'], 0.5)
+        d['loan_type_risk_val'] = self._loan_type_risk.get(d['loan_type'], 0.5)
+        # ISO-8601 hour by slicing; anything else (incl. date-only -> 0) via fromisoformat
+        app_date = d['application_date']
+        hour = int(app_date[11:13]) if app_date[11:13].isdigit() else datetime.fromisoformat(app_date).hour
+        d['midnight_app_flag'] = 1 if 0 <= hour <= 5 else 0
         d['previous_application_count'] = 1 # Incremented during finalization
 
         return d
 
-    def _generate_vector(self, feature_dict: Dict, order: List[str], scaler: Any) -> List[float]:
-        """Scales and orders features into a flat list of floats"""
-        vals = []
-        for feat in order:
-            val = feature_dict.get(feat, 0)
-            if pd.isna(val) or np.isinf(val):
-                val = 0
-            vals.append(val)
-        
-        # Reshape for scaler (1, -1) and return as flat list
-        scaled_vals = scaler.transform([vals])[0]
-        return scaled_vals.tolist()
\ No newline at end of file
+    @staticmethod
+    def _affine_params(scaler: Any):
+        """Expresses a fitted scaler as (x - offset) * inv_scale"""
+        if hasattr(scaler, 'data_range_') and not getattr(scaler, 'clip', False):
+            # MinMaxScaler: x * scale_ + min_
+            inv_scale = scaler.scale_.astype(np.float32)
+            offset = (-scaler.min_ / scaler.scale_).astype(np.float32)
+        elif hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+            # StandardScaler: (x - mean_) / scale_, honouring with_mean / with_std
+            n = scaler.n_features_in_
+            offset = scaler.mean_.astype(np.float32) if scaler.with_mean else np.zeros(n, dtype=np.float32)
+            inv_scale = (1.0 / scaler.scale_).astype(np.float32) if scaler.with_std else np.ones(n, dtype=np.float32)
+        else:
+            raise TypeError(f"Unsupported scaler for vector generation: {type(scaler).__name__}")
+        return offset, inv_scale
+
+    def _gather_vector_features(self, feature_dict: Dict) -> np.ndarray:
+        """Reads every vector feature once (missing -> 0) into a sanitized float32 array"""
+        values = np.fromiter(
+            map(feature_dict.get, self._vector_features, repeat(0.0)),
+            dtype=np.float32, count=len(self._vector_features)
+        )
+        return np.nan_to_num(values, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def _generate_vector(self, values: np.ndarray, idx: np.ndarray, offset: np.ndarray, inv_scale: np.ndarray) -> List[float]:
+        """Orders (by cached index) and scales features into a flat list of floats"""
+        return ((values[idx] - offset) * inv_scale).tolist()
@@ -1,41 +1,99 @@
 import re
+import asyncio
 from typing import List, Dict, Any
-from app.models.pydantic_models import PipelineRequest, PipelineResponse, TwinPayload
+from app.models.pydantic_models import PipelineRequestFast, PipelineResponse, TwinPayload
 from app.models.domain_models import ExtractedFeatureSet, DecisionContext
 from app.core.feature_engine import FeatureEngine
+from app.core.feature_cache import FeatureCache
 from app.services.qdrant_service import QdrantService
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, LLM_ERROR_PREFIX
+from app.services.decision_cache import SemanticDecisionCache
+
+# Structured fields of the LLM decision block (compiled once, used on every response)
+_STATUS_RE = re.compile(r"FINAL_STATUS:\s*\[?(APPROVED|REJECTED)\]?")
+_CONF_RE = re.compile(r"CONFIDENCE_LEVEL:\s*(\d+)%")
+_EXPL_RE = re.compile(r"EXPLANATION:\s*(.*?)(?=SUGGESTIONS:|$)", re.DOTALL)
+_SUGG_RE = re.compile(r"SUGGESTIONS:\s*(.*)", re.DOTALL)
+# One suggestion per non-blank line, without list dashes / surrounding whitespace
+_SUGG_LINE_RE = re.compile(r"^[ \t-]*([^\s-].*?)[\s-]*$", re.M)
 
 class CreditOrchestrator:
     def __init__(
         self, 
         feature_engine: FeatureEngine, 
         qdrant_service: QdrantService, 
-        llm_service: LLMService
+        llm_service: LLMService,
+        feature_cache: FeatureCache,
+        decision_cache: SemanticDecisionCache
     ):
         self.engine = feature_engine
         self.qdrant = qdrant_service
         self.llm = llm_service
+        self.cache = feature_cache
+        self.decisions = decision_cache
 
-    async def process_application(self, request: PipelineRequest, ip_map: Dict, dev_map: Dict) -> PipelineResponse:
+    async def process_application(self, request: PipelineRequestFast, ip_map: Dict, dev_map: Dict) -> PipelineResponse:
         """
         The full standalone pipeline execution.
         """
+        # 1-4. Features, guardrails, memory retrieval and labeled context
+        feature_set, context = await self._prepare_context(request, ip_map, dev_map)
+
+        # 5. LLM Reasoning (Forensic Synthesis), skipped when a near-identical applicant was just scored
+        prompt_data = context.to_llm_prompt_data()
+        decision_vector = feature_set.risk_vector + feature_set.fraud_vector
+        llm_raw_response = await self.decisions.get(prompt_data, decision_vector)
+        if llm_raw_response is None:
+            llm_raw_response = await self.llm.get_decision(prompt_data)
+            await self._remember_decision(prompt_data, decision_vector, llm_raw_response)
+
+        # 6. Response Parsing & Structuring
+        return self._build_final_response(
+            request.application.application_id, 
+            llm_raw_response, 
+            context.risk_memory, 
+            context.fraud_memory
+        )
+
+    async def process_batch(self, requests: List[PipelineRequestFast], ip_map: Dict, dev_map: Dict) -> List[PipelineResponse]:
+        """
+        Bulk underwriting: every application is prepared concurrently and all
+        decision-cache misses go to the LLM as one rate-limited batch.
+        """
+        prepared = await asyncio.gather(*(self._prepare_context(r, ip_map, dev_map) for r in requests))
+        prompts = [context.to_llm_prompt_data() for _, context in prepared]
+        vectors = [fs.risk_vector + fs.fraud_vector for fs, _ in prepared]
+
+        raw_responses = await asyncio.gather(*(self.decisions.get(p, v) for p, v in zip(prompts, vectors)))
+        misses = [i for i, raw in enumerate(raw_responses) if raw is None]
+        fresh = await self.llm.get_decisions_batch([prompts[i] for i in misses])
+        for i, raw in zip(misses, fresh):
+            raw_responses[i] = raw
+        await asyncio.gather(*(self._remember_decision(prompts[i], vectors[i], raw_responses[i]) for i in misses))
+
+        return [
+            self._build_final_response(
+                request.application.application_id,
+                raw,
+                context.risk_memory,
+                context.fraud_memory
+            )
+            for request, (_, context), raw in zip(requests, prepared, raw_responses)
+        ]
+
+    async def _prepare_context(self, request: PipelineRequestFast, ip_map: Dict, dev_map: Dict):
+        """Everything before the LLM call: (ExtractedFeatureSet, DecisionContext)"""
         # 1. Feature Extraction (Standalone Logic)
         feature_set: ExtractedFeatureSet = self.engine.create_feature_set(request, ip_map, dev_map)
+        self.cache.put(request, feature_set) # Reused by /finalize
         
         # 2. Rule-Based Guardrails (Hard Rejections)
         violations = self._check_hard_rules(feature_set.all_features)
         
-        # 3. Memory Retrieval (Dual-Path Similarity)
-        risk_history = self.qdrant.search_similarity(
-            vector=feature_set.risk_vector, 
-            collection_name=self.qdrant.RISK_COLLECTION
-        )
-        
-        fraud_history = self.qdrant.search_similarity(
-            vector=feature_set.fraud_vector, 
-            collection_name=self.qdrant.FRAUD_COLLECTION
+        # 3. Memory Retrieval (Dual-Path Similarity, both searches in flight together)
+        risk_history, fraud_history = await self.qdrant.search_dual(
+            risk_vector=feature_set.risk_vector,
+            fraud_vector=feature_set.fraud_vector
         )
 
         # 4. Contextual Labeling (v5 Calibration Logic)
@@ -46,17 +104,21 @@ class CreditOrchestrator:
             fraud_memory=fraud_history,
             hard_rule_violations=violations
         )
+        return feature_set, context
 
-        # 5. LLM Reasoning (Forensic Synthesis)
-        llm_raw_response = self.llm.get_decision(context.to_llm_prompt_data())
+    async def _remember_decision(self, prompt_data: Dict[str, Any], vector: List[float], raw_response: str):
+        """Stores a fresh LLM decision in the semantic cache (error fallbacks are never cached)"""
+        if not raw_response.startswith(LLM_ERROR_PREFIX):
+            status_match = _STATUS_RE.search(raw_response) # Picks the reuse threshold
+            status = status_match.group(1) if status_match else None
+            await self.decisions.put(prompt_data, vector, raw_response, status)
 
-        # 6. Response Parsing & Structuring
-        return self._build_final_response(
-            request.application.application_id, 
-            llm_raw_response, 
-            risk_history, 
-            fraud_history
-        )
+    def get_feature_set(self, request: PipelineRequestFast, ip_map: Dict, dev_map: Dict) -> ExtractedFeatureSet:
+        """Feature set computed during /analyze if still cached, otherwise recomputed"""
+        feature_set = self.cache.get(request)
+        if feature_set is None:
+            feature_set = self.engine.create_feature_set(request, ip_map, dev_map)
+        return feature_set
 
     def _check_hard_rules(self, f: Dict[str, Any]) -> List[str]:
         """Hard-coded banking constraints"""
@@ -79,10 +141,10 @@ class CreditOrchestrator:
         """Parses the LLM text into a clean Pydantic Response"""
         
         # Regex extraction for structured fields
-        status_match = re.search(r"FINAL_STATUS:\s*\[?(APPROVED|REJECTED)\]?", raw_text)
-        conf_match = re.search(r"CONFIDENCE_LEVEL:\s*(\d+)%", raw_text)
-        expl_match = re.search(r"EXPLANATION:\s*(.*?)(?=SUGGESTIONS:|$)", raw_text, re.DOTALL)
-        sugg_match = re.search(r"SUGGESTIONS:\s*(.*)", raw_text, re.DOTALL)
+        status_match = _STATUS_RE.search(raw_text)
+        conf_match = _CONF_RE.search(raw_text)
+        expl_match = _EXPL_RE.search(raw_text)
+        sugg_match = _SUGG_RE.search(raw_text)
 
         decision = status_match.group(1) if status_match else "REJECTED"
         confidence = int(conf_match.group(1)) if conf_match else 50
@@ -91,24 +153,18 @@ class CreditOrchestrator:
         # Clean suggestions into a list
         suggestions = []
         if sugg_match:
-            suggestions = [s.strip('- ').strip() for s in sugg_match.group(1).split('\n') if s.strip()]
-
-        # Map Qdrant hits to TwinPayloads
-        risk_twins = []
-        for h in risk_hits:
-            p = h.payload
-            risk_twins.append(TwinPayload(
-                similarity_score=round(float(h.score), 2),
-                **p
-            ))
-
-        fraud_twins = []
-        for h in fraud_hits:
-            p = h.payload
-            fraud_twins.append(TwinPayload(
-                similarity_score=round(float(h.score), 2),
-                **p  # This automatically fills unique_ips, fraud_type, mule_ratio, etc.
-            ))
+            suggestions = [m.group(1) for m in _SUGG_LINE_RE.finditer(sugg_match.group(1))]
+
+        # Map Qdrant hits to TwinPayloads (trusted data: our own memory, no re-validation)
+        risk_twins = [
+            TwinPayload.from_memory(round(float(h.score), 2), h.payload)
+            for h in risk_hits
+        ]
+
+        fraud_twins = [
+            TwinPayload.from_memory(round(float(h.score), 2), h.payload)  # Fills unique_ips, fraud_type, mule_ratio, etc.
+            for h in fraud_hits
+        ]
 
         return PipelineResponse(
             application_id=app_id,
@@ -12,7 +12,7 @@ def clean_numerical_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
             clean_data[k] = int(v)
         elif isinstance(v, (np.float64, np.floating)):
             # Replace NaN or Inf with 0.0 to prevent JSON errors
-            if np.isnan(v) or np.isinf(v):
+            if not np.isfinite(v):
                 clean_data[k] = 0.0
             else:
                 clean_data[k] = float(v)
@@ -38,4 +38,5 @@ def get_similarity_label(score: float) -> str:
 
 def normalize_vector(vector: List[float]) -> List[float]:
     """Ensures a vector contains no NaNs and is ready for search"""
-    return [0.0 if np.isnan(x) or np.isinf(x) else float(x) for x in vector]
\ No newline at end of file
+    arr = np.asarray(vector, dtype=np.float64)
+    return np.nan_to_num(arr, nan=0.0, posinf=0.0, neginf=0.0).tolist()
\ No newline at end of file
@@ -1,13 +1,16 @@
+import os
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import router as api_router
+from app.api.deps import lifespan
 from app.core.config import SETTINGS # Configuration like API Keys
 
 app = FastAPI(
     title="IntelliCredit Memory Pipeline",
     description="AI-Driven Credit Risk & Fraud Detection with Vector Memory",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for the Streamlit Dashboard
@@ -26,4 +29,17 @@ def root():
     return {"status": "online", "message": "IntelliCredit API is running"}
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if os.getenv("UVICORN_RELOAD") == "1":
+        # Development: single auto-reloading worker
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        # Production: uvloop/httptools when installed (auto falls back on Windows)
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            loop="auto",
+            http="auto",
+            workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+            log_level=os.getenv("LOG_LEVEL", "warning")
+        )
\ No newline at end of file
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 @dataclass
 class ExtractedFeatureSet:
@@ -24,6 +24,8 @@ class MemoryHit:
     collection: str
     score: float
     payload: Dict[str, Any]
+    # (score, *prompt fields) unpacked once at fetch time, read positionally by the LLM prompt
+    tuple_view: Tuple = ()
 
 @dataclass
 class DecisionContext:
@@ -40,7 +42,7 @@ class DecisionContext:
         """Helper to format data for the LLM Service"""
         return {
             "applicant": self.applicant_features,
-            "risk_twins": [h.payload for h in self.risk_memory],
-            "fraud_twins": [h.payload for h in self.fraud_memory],
+            "risk_twins": [h.tuple_view for h in self.risk_memory],
+            "fraud_twins": [h.tuple_view for h in self.fraud_memory],
             "violations": self.hard_rule_violations
         }
\ No newline at end of file
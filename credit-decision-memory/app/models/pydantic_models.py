@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Literal, Union
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Literal, Union, Any
 from datetime import date, datetime
 
 # --- Categorical Type Definitions (Based on Dataset) ---
@@ -60,6 +60,14 @@ class PipelineRequest(BaseModel):
     application: LoanApplicationInput
     transactions: List[TransactionInput]
 
+class PipelineRequestFast(BaseModel):
+    """
+    Hot-path variant of PipelineRequest: only the application is validated,
+    transactions stay raw dicts with the TransactionInput keys (no per-row Literal checks).
+    """
+    application: LoanApplicationInput
+    transactions: List[Dict[str, Any]]
+
 # --- Output Models ---
 
 class TwinPayload(BaseModel):
@@ -96,12 +104,27 @@ class TwinPayload(BaseModel):
     suspicious_notes_count: Optional[int] = None
     mule_indicator_ratio: Optional[float] = None
 
-    @validator('fraud_type')
+    @field_validator('fraud_type')
+    @classmethod
     def clean_fraud_type(cls, v):
         """Prevents crash if fraud_type is 0 or NaN"""
-        if v is None or v == 0 or v == "0" or str(v).lower() == "nan":
-            return "N/A"
-        return str(v)
+        return _clean_fraud_type(v)
+
+    @classmethod
+    def from_memory(cls, similarity_score: float, payload: Dict[str, Any]) -> "TwinPayload":
+        """
+        Builds a twin from our own Qdrant payload without re-validating it (model_construct).
+        Unknown payload keys are dropped; fraud_type still gets its cleanup.
+        """
+        twin = cls.model_construct(similarity_score=similarity_score, **payload)
+        if 'fraud_type' in payload:
+            twin.fraud_type = _clean_fraud_type(payload['fraud_type'])
+        return twin
+
+def _clean_fraud_type(v: Any) -> str:
+    if v is None or v == 0 or v == "0" or str(v).lower() == "nan":
+        return "N/A"
+    return str(v)
 
 class PipelineResponse(BaseModel):
     application_id: str
@@ -0,0 +1,164 @@
+import time
+import uuid
+import asyncio
+import hashlib
+import orjson
+from cachetools import TTLCache
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+from typing import List, Dict, Any, Optional
+
+# Canonical JSON of the LLM context: sorted keys, NumPy scalars allowed (NaN -> null)
+_CANONICAL_OPTS = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+class SemanticDecisionCache:
+    """
+    Reuses LLM decisions for applicants that were just scored (or nearly so).
+    L1: in-process TTL cache on a hash of the exact context, skips Qdrant entirely.
+    L2: on-disk Qdrant collection keyed by the applicant's scaled risk + fraud vectors, hit on
+        Euclidean distance <= the bound of the cached decision (REJECTED needs a closer match).
+        Only entries with the exact same violations and twins (as the prompt shows them) are
+        candidates, so the vector only has to cover the applicant's own numbers.
+    Entries older than ttl are never served and are swept by run_eviction().
+    """
+    COLLECTION = "decision_cache"
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        approved_max_distance: float = 0.05,
+        rejected_max_distance: float = 0.02,
+        l1_size: int = 1024,
+        ttl: int = 7 * 24 * 3600
+    ):
+        self.client = client
+        self.ttl = ttl
+        # Unparseable decisions fall back to the strictest bound
+        self.max_distances = {"APPROVED": approved_max_distance, "REJECTED": rejected_max_distance}
+        self._strictest = min(self.max_distances.values())
+        self._loosest = max(self.max_distances.values())
+        self._l1 = TTLCache(maxsize=l1_size, ttl=ttl)
+
+    @staticmethod
+    def context_key(context_data: Dict[str, Any]) -> bytes:
+        return hashlib.blake2b(orjson.dumps(context_data, option=_CANONICAL_OPTS), digest_size=16).digest()
+
+    @staticmethod
+    def guard_key(context_data: Dict[str, Any]) -> str:
+        """Hash of the non-vector decision inputs: violations and twins (similarity as printed, %.2f)"""
+        guard = (
+            context_data.get("violations", []),
+            [("%.2f" % t[0], *t[1:]) for t in context_data.get("risk_twins", [])],
+            [("%.2f" % t[0], *t[1:]) for t in context_data.get("fraud_twins", [])],
+        )
+        return hashlib.blake2b(orjson.dumps(guard, option=_CANONICAL_OPTS), digest_size=16).hexdigest()
+
+    async def ensure_collection(self, vector_size: int) -> bool:
+        """Creates the cache collection (HNSW graph on disk, indexed ts/guard) on first start"""
+        try:
+            if await self.client.collection_exists(self.COLLECTION):
+                info = await self.client.get_collection(self.COLLECTION)
+                if info.config.params.vectors.distance != models.Distance.EUCLID:
+                    # Entries from the earlier cosine layout: the cache is disposable, start over
+                    await self.client.delete_collection(self.COLLECTION)
+            if not await self.client.collection_exists(self.COLLECTION):
+                await self.client.create_collection(
+                    collection_name=self.COLLECTION,
+                    vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.EUCLID, on_disk=True),
+                    hnsw_config=models.HnswConfigDiff(m=16, ef_construct=128, on_disk=True),
+                    optimizers_config=models.OptimizersConfigDiff(default_segment_number=4),
+                    on_disk_payload=True
+                )
+                await self.client.create_payload_index(
+                    collection_name=self.COLLECTION,
+                    field_name="ts",
+                    field_schema=models.PayloadSchemaType.FLOAT
+                )
+                await self.client.create_payload_index(
+                    collection_name=self.COLLECTION,
+                    field_name="guard",
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+            return True
+        except Exception as e:
+            print(f"Decision Cache Setup Error: {e}")
+            return False
+
+    def _candidate_filter(self, guard: str) -> models.Filter:
+        return models.Filter(must=[
+            models.FieldCondition(key="guard", match=models.MatchValue(value=guard)),
+            models.FieldCondition(key="ts", range=models.Range(gte=time.time() - self.ttl))
+        ])
+
+    async def get(self, context_data: Dict[str, Any], vector: List[float]) -> Optional[str]:
+        """Cached decision for this context (exact) or its nearest neighbour (semantic), else None"""
+        key = self.context_key(context_data)
+        decision = self._l1.get(key)
+        if decision is not None:
+            return decision
+
+        try:
+            result = await self.client.query_points(
+                collection_name=self.COLLECTION,
+                query=vector,
+                query_filter=self._candidate_filter(self.guard_key(context_data)),
+                limit=1,
+                score_threshold=self._loosest,
+                with_payload=["decision", "status"]
+            )
+        except Exception as e:
+            print(f"Decision Cache Lookup Error: {e}")
+            return None
+
+        if not result.points:
+            return None
+        hit = result.points[0]
+        if hit.score > self.max_distances.get(hit.payload.get("status"), self._strictest):
+            return None
+        decision = hit.payload["decision"]
+        self._l1[key] = decision
+        return decision
+
+    async def put(self, context_data: Dict[str, Any], vector: List[float], decision: str, status: Optional[str] = None) -> bool:
+        key = self.context_key(context_data)
+        self._l1[key] = decision
+        try:
+            await self.client.upsert(
+                collection_name=self.COLLECTION,
+                points=[
+                    models.PointStruct(
+                        id=str(uuid.UUID(bytes=key)), # Same context -> same point
+                        vector=vector,
+                        payload={
+                            "decision": decision,
+                            "status": status,
+                            "guard": self.guard_key(context_data),
+                            "ts": time.time()
+                        }
+                    )
+                ]
+            )
+            return True
+        except Exception as e:
+            print(f"Decision Cache Upsert Error: {e}")
+            return False
+
+    async def evict_expired(self) -> bool:
+        """Deletes every entry older than ttl (e.g. decided under last week's policy)"""
+        try:
+            await self.client.delete(
+                collection_name=self.COLLECTION,
+                points_selector=models.FilterSelector(filter=models.Filter(must=[
+                    models.FieldCondition(key="ts", range=models.Range(lt=time.time() - self.ttl))
+                ]))
+            )
+            return True
+        except Exception as e:
+            print(f"Decision Cache Eviction Error: {e}")
+            return False
+
+    async def run_eviction(self, interval: int = 3600):
+        """Background sweep, started in the app lifespan and cancelled on shutdown"""
+        while True:
+            await self.evict_expired()
+            await asyncio.sleep(interval)
@@ -1,41 +1,168 @@
+import re
 import json
-from groq import Groq
-from typing import Dict, Any, List
+import asyncio
+import httpx
+from groq import AsyncGroq
+from aiolimiter import AsyncLimiter
+from typing import Dict, Any, List, Optional
 from app.core.config import SETTINGS # Assuming we store keys in config
 
+# Prefix of the fallback text returned when Groq fails (never cached)
+LLM_ERROR_PREFIX = "Error communicating with LLM"
+
+def build_http_client() -> httpx.AsyncClient:
+    """Pooled HTTP/2 transport for Groq: TLS connections stay hot across concurrent calls"""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+
+# The decision block ends with SUGGESTIONS; the first line after its items that is neither
+# a list item nor an indented continuation means we have it all (blank lines are skipped)
+_SUGGESTIONS_MARKER = "SUGGESTIONS:"
+_SUGGESTION_LINE_RE = re.compile(r'\s*[-*\u2022\d]|\s+\S')
+_SUGGESTIONS_MAX_CHARS = 1500 # Hard stop if the model never leaves the list
+
+# Prompt pieces built once at import (every decision reuses them)
+_SYSTEM_PROMPT = (
+    "You are a Senior Forensic Underwriter and Credit Risk Specialist. "
+    "Your task is to provide a final decision on a loan application by "
+    "comparing the current applicant against the bank's 'Historical Memory'. "
+    "You must balance financial risk with behavioral fraud anomalies."
+)
+_RISK_TWIN_FMT = "- Twin (Similarity: %.2f): Status %s, CIBIL %s"
+_FRAUD_TWIN_FMT = "- Anomaly Match (Similarity: %.2f): Type %s, Outcome %s"
+
+# Static prompt skeleton, filled with %-formatting (literal percent signs are doubled)
+_FORENSIC_PROMPT = """
+        ### NEW APPLICANT SUMMARY
+        - CIBIL Score: %(cibil_score)s
+        - Claimed Monthly Income: $%(monthly_income)s
+        - Loan Amount Requested: $%(loan_amount_requested)s
+        - Device Sharing Score: %(device_sharing_score)s
+        - Midnight Application: %(midnight)s
+
+        ### HARD RULE VIOLATIONS (Pre-processed)
+        %(violations)s
+
+        ### HISTORICAL FINANCIAL TWINS (Risk Memory)
+        %(risk_memory)s
+
+        ### HISTORICAL ANOMALIES (Fraud Memory)
+        %(fraud_memory)s
+
+        ### DECISION LOGIC GUIDELINES
+        1. FRAUD OVERRIDE: If a Fraud Match similarity is > 0.90, REJECT regardless of CIBIL score.
+        2. LIFESTYLE CHECK: Look at 'Income vs Spend' ratios. If the applicant claims high income but twins with low spend were rejected for 'Income Misrepresentation', flag it.
+        3. BUFFER: If Fraud Match similarity is < 0.85 and Credit Twins were 'Approved', lean towards APPROVAL.
+        4. DEVICE SCORE: A score of 1.0 is PERFECT and SAFE. Do NOT penalize for a score of 1.
+        5. SIMILARITY WEIGHT: If any Twin has a similarity > 0.95, that twin represents the "Ground Truth" of how this bank handles such cases.
+        6. STATUS CONFLICT: If twins are split between Approved and Declined, prioritize 'Approved' if the applicant's CIBIL is > 650 and Debt-to-Income is < 40%%.
+        7. SIMILARITY CHECK: Do NOT say similarity is low if scores are > 0.90. 0.90+ is VERY HIGH.
+        4. BE DECISIVE.
+
+        ### REQUIRED OUTPUT FORMAT (Strict)
+        FINAL_STATUS: [APPROVED or REJECTED]
+        CONFIDENCE_LEVEL: [0-100]%%
+        EXPLANATION: [3-5 sentences analyzing the match between current data and historical memory]
+        SUGGESTIONS: [List 2-3 specific verification steps for the agent]
+        """
+
 class LLMService:
-    def __init__(self, api_key: str = SETTINGS.GROQ_API_KEY, model_name: str = "llama-3.3-70b-versatile"):
-        self.client = Groq(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str = SETTINGS.GROQ_API_KEY,
+        model_name: str = "llama-3.3-70b-versatile",
+        max_concurrency: int = 8,
+        requests_per_minute: int = 30,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        # Pass a shared build_http_client() so every service instance reuses one connection pool
+        self.client = AsyncGroq(api_key=api_key, http_client=http_client or build_http_client())
         self.model = model_name
 
-    def get_decision(self, context_data: Dict[str, Any]) -> str:
+        # Bounded fan-out + Groq's per-minute request quota, shared by single and batch calls
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._limiter = AsyncLimiter(requests_per_minute, 60)
+
+    async def get_decision(self, context_data: Dict[str, Any]) -> str:
         """
         Communicates with Groq to get the final underwriter decision.
         context_data: Formatted dictionary from OrchestratorContext
         """
-        
-        system_prompt = (
-            "You are a Senior Forensic Underwriter and Credit Risk Specialist. "
-            "Your task is to provide a final decision on a loan application by "
-            "comparing the current applicant against the bank's 'Historical Memory'. "
-            "You must balance financial risk with behavioral fraud anomalies."
-        )
-
         user_prompt = self._build_forensic_prompt(context_data)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.0, # Precision is mandatory
-                max_tokens=800
-            )
-            return response.choices[0].message.content
+            async with self._sem, self._limiter:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": _SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.0, # Precision is mandatory
+                    max_tokens=800, # Upper bound only: the stream is cut once the block is complete
+                    stream=True
+                )
+                return await self._read_decision(response)
         except Exception as e:
-            return f"Error communicating with LLM: {str(e)}"
+            return f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+    async def _read_decision(self, stream) -> str:
+        """Accumulates streamed deltas and closes the stream as soon as SUGGESTIONS is finished"""
+        text = ""
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                text += delta
+                end = self._decision_end(text)
+                if end >= 0:
+                    text = text[:end] # Drop whatever the last chunk carried past the block
+                    break
+        finally:
+            await stream.close()
+        return text.strip()
+
+    @staticmethod
+    def _decision_end(text: str) -> int:
+        """Index of the first line past the SUGGESTIONS items, or -1 while still incomplete"""
+        idx = text.find(_SUGGESTIONS_MARKER)
+        if idx < 0:
+            return -1
+        body_start = idx + len(_SUGGESTIONS_MARKER)
+        if len(text) - body_start > _SUGGESTIONS_MAX_CHARS:
+            return body_start + _SUGGESTIONS_MAX_CHARS
+
+        # The first non-blank line is always content (list or prose); later ones must be items
+        seen_content = False
+        line_start = body_start
+        while line_start < len(text):
+            line_end = text.find("\n", line_start)
+            line = text[line_start:] if line_end < 0 else text[line_start:line_end]
+            if line.strip():
+                if seen_content and not _SUGGESTION_LINE_RE.match(line):
+                    return line_start
+                seen_content = True
+            if line_end < 0:
+                break # Last line still streaming
+            line_start = line_end + 1
+        return -1
+
+    async def get_decisions_batch(self, contexts: List[Dict[str, Any]]) -> List[str]:
+        """
+        Decisions for many applicants with concurrent Groq calls (same order as contexts).
+        Concurrency and rate are capped by the limits above; failures become error strings.
+        """
+        results = await asyncio.gather(*(self.get_decision(ctx) for ctx in contexts), return_exceptions=True)
+        return [
+            f"{LLM_ERROR_PREFIX}: {str(r)}" if isinstance(r, BaseException) else r
+            for r in results
+        ]
 
     def _build_forensic_prompt(self, data: Dict[str, Any]) -> str:
         """Constructs the high-density prompt for Llama 3.3"""
@@ -45,49 +172,23 @@ class LLMService:
         fraud_twins = data.get("fraud_twins", [])
         violations = data.get("violations", [])
 
-        # Format Memory hits into strings
+        # Format Memory hits into strings (twins are MemoryHit.tuple_view rows, already in format order)
         risk_memory_str = "\n".join([
-            f"- Twin (Similarity: {t.get('score', 0):.2f}): Status {t.get('loan_status')}, CIBIL {t.get('cibil_score')}"
-            for t in risk_twins
+            _RISK_TWIN_FMT % t for t in risk_twins
         ]) if risk_twins else "No similar financial profiles found."
 
         fraud_memory_str = "\n".join([
-            f"- Anomaly Match (Similarity: {t.get('score', 0):.2f}): Type {t.get('fraud_type')}, Outcome {t.get('loan_status')}"
-            for t in fraud_twins
+            _FRAUD_TWIN_FMT % t for t in fraud_twins
         ]) if fraud_twins else "No similar fraud patterns found."
 
         # Construct the Prompt
-        prompt = f"""
-        ### NEW APPLICANT SUMMARY
-        - CIBIL Score: {applicant.get('cibil_score')}
-        - Claimed Monthly Income: ${applicant.get('monthly_income')}
-        - Loan Amount Requested: ${applicant.get('loan_amount_requested')}
-        - Device Sharing Score: {applicant.get('max_device_sharing_score')}
-        - Midnight Application: {"Yes" if applicant.get('midnight_app_flag') == 1 else "No"}
-
-        ### HARD RULE VIOLATIONS (Pre-processed)
-        {", ".join(violations) if violations else "None"}
-
-        ### HISTORICAL FINANCIAL TWINS (Risk Memory)
-        {risk_memory_str}
-
-        ### HISTORICAL ANOMALIES (Fraud Memory)
-        {fraud_memory_str}
-
-        ### DECISION LOGIC GUIDELINES
-        1. FRAUD OVERRIDE: If a Fraud Match similarity is > 0.90, REJECT regardless of CIBIL score.
-        2. LIFESTYLE CHECK: Look at 'Income vs Spend' ratios. If the applicant claims high income but twins with low spend were rejected for 'Income Misrepresentation', flag it.
-        3. BUFFER: If Fraud Match similarity is < 0.85 and Credit Twins were 'Approved', lean towards APPROVAL.
-        4. DEVICE SCORE: A score of 1.0 is PERFECT and SAFE. Do NOT penalize for a score of 1.
-        5. SIMILARITY WEIGHT: If any Twin has a similarity > 0.95, that twin represents the "Ground Truth" of how this bank handles such cases.
-        6. STATUS CONFLICT: If twins are split between Approved and Declined, prioritize 'Approved' if the applicant's CIBIL is > 650 and Debt-to-Income is < 40%.
-        7. SIMILARITY CHECK: Do NOT say similarity is low if scores are > 0.90. 0.90+ is VERY HIGH.
-        4. BE DECISIVE.
-
-        ### REQUIRED OUTPUT FORMAT (Strict)
-        FINAL_STATUS: [APPROVED or REJECTED]
-        CONFIDENCE_LEVEL: [0-100]%
-        EXPLANATION: [3-5 sentences analyzing the match between current data and historical memory]
-        SUGGESTIONS: [List 2-3 specific verification steps for the agent]
-        """
-        return prompt
\ No newline at end of file
+        return _FORENSIC_PROMPT % {
+            'cibil_score': applicant.get('cibil_score'),
+            'monthly_income': applicant.get('monthly_income'),
+            'loan_amount_requested': applicant.get('loan_amount_requested'),
+            'device_sharing_score': applicant.get('max_device_sharing_score'),
+            'midnight': "Yes" if applicant.get('midnight_app_flag') == 1 else "No",
+            'violations': ", ".join(violations) if violations else "None",
+            'risk_memory': risk_memory_str,
+            'fraud_memory': fraud_memory_str,
+        }
\ No newline at end of file
@@ -1,23 +1,40 @@
-from qdrant_client import QdrantClient
+import asyncio
+import orjson
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
-from typing import List, Dict, Any
-import numpy as np
+from typing import List, Dict, Any, Tuple
 from app.models.domain_models import MemoryHit
 
+# NumPy scalars -> JSON-native values in one C-level pass (NaN/Inf/None -> null)
+_PAYLOAD_OPTS = orjson.OPT_SERIALIZE_NUMPY
+
+# Server-side int8 scalar quantization (queries stay FP32, Qdrant quantizes and rescores)
+INT8_QUANTIZATION = models.ScalarQuantization(
+    scalar=models.ScalarQuantizationConfig(
+        type=models.ScalarType.INT8,
+        quantile=0.99,
+        always_ram=True
+    )
+)
+
+# Payload fields each twin contributes to the LLM prompt, in _RISK/_FRAUD_TWIN_FMT order
+RISK_VIEW_FIELDS = ("loan_status", "cibil_score")
+FRAUD_VIEW_FIELDS = ("fraud_type", "loan_status")
+
 class QdrantService:
     def __init__(self, url: str, api_key: str):
-        self.client = QdrantClient(url=url, api_key=api_key)
+        self.client = AsyncQdrantClient(url=url, api_key=api_key)
         
         # Collection Names
         self.RISK_COLLECTION = "credit_decision_memory"
         self.FRAUD_COLLECTION = "fraud_anomaly_memory"
 
-    def search_similarity(self, vector: List[float], collection_name: str, limit: int = 3) -> List[MemoryHit]:
+    async def search_similarity(self, vector: List[float], collection_name: str, limit: int = 3, view_fields: Tuple[str, ...] = ()) -> List[MemoryHit]:
         """
         Generic search function to find the 'Past Ghosts' in memory.
         """
         try:
-            search_result = self.client.query_points(
+            search_result = await self.client.query_points(
                 collection_name=collection_name,
                 query=vector,
                 limit=limit,
@@ -29,7 +46,8 @@ class QdrantService:
                 hits.append(MemoryHit(
                     collection=collection_name,
                     score=hit.score,
-                    payload=hit.payload
+                    payload=hit.payload,
+                    tuple_view=(hit.score, *(hit.payload.get(f) for f in view_fields))
                 ))
             return hits
         
@@ -37,24 +55,26 @@ class QdrantService:
             print(f"Qdrant Search Error on {collection_name}: {e}")
             return []
 
-    def add_to_memory(self, application_id: str, vector: List[float], payload: Dict[str, Any], collection_name: str):
+    async def search_dual(self, risk_vector: List[float], fraud_vector: List[float], limit: int = 3) -> Tuple[List[MemoryHit], List[MemoryHit]]:
+        """
+        Risk + Fraud memory lookups with overlapping round-trips.
+        (The two collections differ, so a single query_batch_points can't cover both.)
+        """
+        risk_hits, fraud_hits = await asyncio.gather(
+            self.search_similarity(risk_vector, self.RISK_COLLECTION, limit, RISK_VIEW_FIELDS),
+            self.search_similarity(fraud_vector, self.FRAUD_COLLECTION, limit, FRAUD_VIEW_FIELDS)
+        )
+        return risk_hits, fraud_hits
+
+    async def add_to_memory(self, application_id: str, vector: List[float], payload: Dict[str, Any], collection_name: str):
         """
         The 'Self-Learning' component. Saves a finalized decision back to vector storage.
         """
         try:
-            # Clean payload: Qdrant/JSON doesn't like NumPy types (int64, float64)
-            clean_payload = {}
-            for k, v in payload.items():
-                if isinstance(v, (np.int64, np.integer)):
-                    clean_payload[k] = int(v)
-                elif isinstance(v, (np.float64, np.floating)):
-                    clean_payload[k] = float(v)
-                elif v is None:
-                    clean_payload[k] = "N/A"
-                else:
-                    clean_payload[k] = v
+            # Clean payload: Qdrant/JSON doesn't like NumPy types (int64, float64) or NaN
+            clean_payload = orjson.loads(orjson.dumps(payload, option=_PAYLOAD_OPTS))
 
-            self.client.upsert(
+            await self.client.upsert(
                 collection_name=collection_name,
                 points=[
                     models.PointStruct(
@@ -69,10 +89,32 @@ class QdrantService:
             print(f"Qdrant Upsert Error on {collection_name}: {e}")
             return False
 
-    def check_health(self) -> bool:
+    async def ensure_quantization(self) -> bool:
+        """
+        Enables int8 quantization on memory collections that have none yet.
+        Collections built before it was added to the notebooks get it here at startup; every
+        other start (one per worker) only reads the config, so no optimizer rebuild is triggered.
+        """
+        try:
+            names = (self.RISK_COLLECTION, self.FRAUD_COLLECTION)
+            infos = await asyncio.gather(*(self.client.get_collection(name) for name in names))
+            await asyncio.gather(*(
+                self.client.update_collection(collection_name=name, quantization_config=INT8_QUANTIZATION)
+                for name, info in zip(names, infos) if info.config.quantization_config is None
+            ))
+            return True
+        except Exception as e:
+            print(f"Qdrant Quantization Error: {e}")
+            return False
+
+    async def check_health(self) -> bool:
         """Dashboard utility to check if memory is live"""
         try:
-            self.client.get_collections()
+            await self.client.get_collections()
             return True
         except:
-            return False
\ No newline at end of file
+            return False
+
+    async def close(self):
+        """Releases the client's connection pool (called on app shutdown)"""
+        await self.client.close()
\ No newline at end of file
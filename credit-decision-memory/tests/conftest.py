@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Settings are read at import time; tests never reach Groq or Qdrant
+for key in ("GROQ_API_KEY", "QDRANT_URL", "QDRANT_API_KEY"):
+    os.environ.setdefault(key, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from app.services.decision_cache import SemanticDecisionCache
+
+DIM = 4
+VECTOR = [0.2, 0.4, 0.6, 0.8]
+CONTEXT = {
+    "applicant": {"cibil_score": 720, "monthly_income": 5000.0},
+    "risk_twins": [(0.9712, "Approved", 715)],
+    "fraud_twins": [(0.4103, "None", "Approved")],
+    "violations": [],
+}
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _cache(client=None):
+    cache = SemanticDecisionCache(client or AsyncQdrantClient(location=":memory:"))
+    assert await cache.ensure_collection(DIM)
+    return cache
+
+
+def _fresh_l1(cache):
+    # Same Qdrant collection, empty in-process layer: forces the L2 lookup
+    return SemanticDecisionCache(cache.client)
+
+
+def test_exact_context_is_served_from_l1():
+    async def scenario():
+        cache = await _cache()
+        await cache.put(CONTEXT, VECTOR, "FINAL_STATUS: APPROVED", "APPROVED")
+        cache.client = None # Any Qdrant call would fail
+        return await cache.get(CONTEXT, VECTOR)
+    assert _run(scenario()) == "FINAL_STATUS: APPROVED"
+
+
+def test_nearby_applicant_with_same_twins_hits_l2():
+    async def scenario():
+        cache = await _cache()
+        await cache.put(CONTEXT, VECTOR, "FINAL_STATUS: APPROVED", "APPROVED")
+        nearby = dict(CONTEXT, applicant={"cibil_score": 721, "monthly_income": 5000.0})
+        return await _fresh_l1(cache).get(nearby, [v + 0.01 for v in VECTOR])
+    assert _run(scenario()) == "FINAL_STATUS: APPROVED"
+
+
+def test_different_violations_or_twins_never_hit():
+    async def scenario():
+        cache = await _cache()
+        await cache.put(CONTEXT, VECTOR, "FINAL_STATUS: APPROVED", "APPROVED")
+        l2 = _fresh_l1(cache)
+        violated = dict(CONTEXT, violations=["Applicant below legal age"])
+        fraud_twin = dict(CONTEXT, fraud_twins=[(0.4103, "Identity Theft", "Rejected")])
+        closer_twin = dict(CONTEXT, risk_twins=[(0.9912, "Approved", 715)])
+        return [await l2.get(ctx, VECTOR) for ctx in (violated, fraud_twin, closer_twin)]
+    assert _run(scenario()) == [None, None, None]
+
+
+def test_twin_similarity_is_matched_as_printed():
+    # The prompt shows %.2f, so sub-percent drift of a twin's similarity keeps the same guard
+    drifted = dict(CONTEXT, risk_twins=[(0.9704, "Approved", 715)])
+    assert SemanticDecisionCache.guard_key(drifted) == SemanticDecisionCache.guard_key(CONTEXT)
+
+
+def test_cosine_collection_is_recreated_as_euclidean():
+    async def scenario():
+        client = AsyncQdrantClient(location=":memory:")
+        await client.create_collection(
+            SemanticDecisionCache.COLLECTION,
+            vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE)
+        )
+        await _cache(client)
+        info = await client.get_collection(SemanticDecisionCache.COLLECTION)
+        return info.config.params.vectors.distance
+    assert _run(scenario()) == models.Distance.EUCLID
+
+
+def test_scaled_risk_vector_does_not_hit():
+    # Same direction, 1.5x the magnitude: cosine 1.0, but a very different applicant
+    async def scenario():
+        cache = await _cache()
+        await cache.put(CONTEXT, VECTOR, "FINAL_STATUS: APPROVED", "APPROVED")
+        return await _fresh_l1(cache).get(CONTEXT, [v * 1.5 for v in VECTOR])
+    assert _run(scenario()) is None
+
+
+def _mocked(distance, status):
+    client = AsyncMock()
+    hit = SimpleNamespace(score=distance, payload={"decision": f"FINAL_STATUS: {status}", "status": status})
+    client.query_points.return_value = SimpleNamespace(points=[hit])
+    return SemanticDecisionCache(client, approved_max_distance=0.05, rejected_max_distance=0.02)
+
+
+def test_lookup_asks_qdrant_for_the_loosest_bound_of_fresh_matching_entries():
+    cache = _mocked(0.01, "APPROVED")
+    _run(cache.get(CONTEXT, VECTOR))
+    kwargs = cache.client.query_points.call_args.kwargs
+    assert kwargs["score_threshold"] == 0.05
+    conditions = {c.key: c for c in kwargs["query_filter"].must}
+    assert conditions["guard"].match.value == SemanticDecisionCache.guard_key(CONTEXT)
+    assert conditions["ts"].range.gte is not None
+
+
+@pytest.mark.parametrize("distance, status, served", [
+    (0.04, "APPROVED", True),
+    (0.06, "APPROVED", False),
+    (0.015, "REJECTED", True),
+    (0.03, "REJECTED", False), # Within the APPROVED bound, too far to re-use a rejection
+    (0.03, None, False), # Unparsed status falls back to the strictest bound
+])
+def test_per_status_distance_bounds(distance, status, served):
+    cache = _mocked(distance, status)
+    decision = _run(cache.get(CONTEXT, VECTOR))
+    assert (decision is not None) is served
+    # Served L2 hits are promoted to L1, so the next identical lookup skips Qdrant
+    if served:
+        _run(cache.get(CONTEXT, VECTOR))
+        assert cache.client.query_points.await_count == 1
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from app.core.feature_cache import FeatureCache
+from app.models.domain_models import ExtractedFeatureSet
+from app.models.pydantic_models import LoanApplicationInput, PipelineRequestFast, TransactionInput
+
+SAMPLE_DATA = Path(__file__).resolve().parents[1] / "sample_data"
+
+
+@pytest.fixture(scope="module")
+def payload():
+    loan = pd.read_csv(SAMPLE_DATA / "loan_applications.csv", keep_default_na=False, nrows=1)
+    txs = pd.read_csv(SAMPLE_DATA / "transactions.csv", keep_default_na=False, nrows=5)
+    return (
+        loan[list(LoanApplicationInput.model_fields)].to_dict("records")[0],
+        txs[list(TransactionInput.model_fields)].to_dict("records"),
+    )
+
+
+def _request(loan, rows):
+    return PipelineRequestFast(application=loan, transactions=[dict(r) for r in rows])
+
+
+def _put(cache, request):
+    feature_set = ExtractedFeatureSet(
+        application_id=request.application.application_id,
+        customer_id=request.application.customer_id,
+        all_features={}, risk_vector=[0.0], fraud_vector=[0.0]
+    )
+    cache.put(request, feature_set)
+    return feature_set
+
+
+def test_identical_request_reuses_the_feature_set(payload):
+    cache = FeatureCache()
+    loan, rows = payload
+    feature_set = _put(cache, _request(loan, rows))
+    assert cache.get(_request(loan, rows)) is feature_set # Equal data, separately parsed
+
+
+@pytest.mark.parametrize("field, value", [
+    ("transaction_amount", 1.0),
+    ("transaction_status", "Failed"),
+    ("transaction_notes", "Verify refund"),
+    ("transaction_date", "2021-01-01 00:00:00"),
+    ("fraud_flag", 1),
+])
+def test_edit_to_an_earlier_transaction_recomputes(payload, field, value):
+    cache = FeatureCache()
+    loan, rows = payload
+    _put(cache, _request(loan, rows))
+    edited = [dict(rows[0], **{field: value})] + rows[1:]
+    assert cache.get(_request(loan, edited)) is None
+
+
+def test_changed_application_or_invalidation_recomputes(payload):
+    cache = FeatureCache()
+    loan, rows = payload
+    request = _request(loan, rows)
+    _put(cache, request)
+    assert cache.get(_request(dict(loan, monthly_income=loan['monthly_income'] + 1), rows)) is None
+    cache.invalidate(request.application.application_id)
+    assert cache.get(request) is None
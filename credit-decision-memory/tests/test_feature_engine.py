@@ -0,0 +1,203 @@
+import math
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from app.core.config import SETTINGS
+from app.core.feature_engine import FeatureEngine, InvalidTransactionsError
+from app.models.pydantic_models import LoanApplicationInput, PipelineRequestFast, TransactionInput
+
+SAMPLE_DATA = Path(__file__).resolve().parents[1] / "sample_data"
+N_APPLICATIONS = 300 # x 2 density-map settings = 600 feature sets
+
+
+def _pandas_reference(loan, transactions, ip_map, dev_map, risk_scaler, fraud_scaler):
+    """The original DataFrame implementation, kept as the oracle for the array/Numba engine"""
+    d = dict(loan)
+    tx_df = pd.DataFrame(transactions)
+    essential_val = 0
+    if not tx_df.empty:
+        tx_df['transaction_date'] = pd.to_datetime(tx_df['transaction_date'])
+        total_spent = tx_df['transaction_amount'].sum()
+        avg_tx = tx_df['transaction_amount'].mean()
+        total_months = max(tx_df['transaction_date'].dt.to_period('M').nunique(), 1)
+        essential_val = tx_df[tx_df['merchant_category'].isin(SETTINGS.ESSENTIAL_CATEGORIES)]['transaction_amount'].sum()
+        lifestyle_val = tx_df[tx_df['merchant_category'].isin(SETTINGS.LIFESTYLE_CATEGORIES)]['transaction_amount'].sum()
+        debt_val = tx_df[tx_df['merchant_category'] == 'Financial Services']['transaction_amount'].sum()
+        cash_val = tx_df[tx_df['merchant_category'] == 'Cash Withdrawal']['transaction_amount'].sum()
+
+        d['avg_monthly_balance'] = tx_df['account_balance_after_transaction'].mean()
+        d['balance_volatility'] = tx_df['account_balance_after_transaction'].std()
+        d['total_monthly_burn_rate'] = total_spent / total_months
+        d['essential_spending_ratio'] = essential_val / (total_spent + 1)
+        d['lifestyle_spending_ratio'] = lifestyle_val / (total_spent + 1)
+        d['transaction_frequency'] = len(tx_df) / total_months
+        d['international_tx_indicator'] = tx_df['is_international_transaction'].sum()
+        d['device_diversity_score'] = tx_df['device_used'].nunique()
+        d['ip_stability_ratio'] = (tx_df['ip_address'].nunique()) / (d['transaction_frequency'] + 0.0001)
+        d['debt_indicator_ratio'] = debt_val / (total_spent + 1)
+        d['cash_dependence_ratio'] = cash_val / (total_spent + 1)
+        d['min_balance_reached'] = tx_df['account_balance_after_transaction'].min()
+        d['max_transaction_value'] = tx_df['transaction_amount'].max()
+        d['avg_transaction_value'] = tx_df['transaction_amount'].mean()
+
+        d['avg_tx_amount'] = avg_tx
+        d['max_tx_amount'] = tx_df['transaction_amount'].max()
+        d['intl_tx_count'] = tx_df['is_international_transaction'].sum()
+        d['unique_locations'] = tx_df['transaction_location'].nunique()
+        d['unique_ips'] = tx_df['ip_address'].nunique()
+        d['unique_devices'] = tx_df['device_used'].nunique()
+        d['unique_destinations'] = tx_df['transaction_source_destination'].nunique()
+        d['financial_service_spend'] = debt_val
+        d['max_ip_sharing_score'] = tx_df['ip_address'].map(ip_map).max() if ip_map else 1
+        d['max_device_sharing_score'] = tx_df['device_used'].map(dev_map).max() if dev_map else 1
+        d['suspicious_notes_count'] = tx_df['transaction_notes'].str.contains('Test|Refund|Verify|Cash', case=False).sum()
+        d['failed_ratio'] = (tx_df['transaction_status'] == 'Failed').sum() / (len(tx_df) + 1)
+        d['mule_indicator_ratio'] = d['unique_destinations'] / (len(tx_df) + 1)
+        d['intl_tx_ratio'] = d['intl_tx_count'] / (len(tx_df) + 1)
+        d['avg_tx_velocity'] = len(tx_df) / 30
+        d['income_validation_ratio'] = d['monthly_income'] / (avg_tx + 1)
+        d['loan_to_spend_ratio'] = d['loan_amount_requested'] / (total_spent + 1)
+    else:
+        d['min_balance_reached'] = 0
+        d['max_transaction_value'] = 0
+        d['avg_transaction_value'] = 0
+        for feat in ['avg_monthly_balance', 'balance_volatility', 'total_monthly_burn_rate', 'essential_spending_ratio']:
+            d[feat] = 0
+
+    est_emi = (d['loan_amount_requested'] / d['loan_tenure_months']) * 1.1
+    d['loan_to_income_ratio'] = d['loan_amount_requested'] / (d['monthly_income'] * 12 + 1)
+    d['installment_to_income_ratio'] = (d['existing_emis_monthly'] + est_emi) / (d['monthly_income'] + 1)
+    d['disposable_income'] = d['monthly_income'] - d['existing_emis_monthly']
+    d['age_at_loan_end'] = d['applicant_age'] + (d['loan_tenure_months'] / 12)
+    d['income_per_dependent'] = d['monthly_income'] / (d['number_of_dependents'] + 1)
+    d['cash_flow_coverage_ratio'] = d.get('avg_monthly_balance', 0) / (d.get('total_monthly_burn_rate', 0) + 1)
+    d['payment_to_income_reality_check'] = essential_val / (d['monthly_income'] + 1)
+    d['income_stability_proxy'] = d.get('balance_volatility', 0) / (d.get('avg_monthly_balance', 0) + 1)
+
+    d['gender_val'] = {'Male': 0, 'Female': 1, 'Other': 0.5}.get(d['gender'], 0)
+    d['property_val'] = {'Rented': 0, 'Jointly Owned': 0.5, 'Owned': 1}.get(d['property_ownership_status'], 0)
+    d['cibil_category_val'] = 0 if d['cibil_score'] <= 600 else 0.33 if d['cibil_score'] <= 700 else 0.66 if d['cibil_score'] <= 800 else 1.0
+    d['employment_risk_val'] = SETTINGS.EMPLOYMENT_RISK_MAP.get(d['employment_status'], 0.5)
+    d['loan_type_risk_val'] = SETTINGS.LOAN_TYPE_RISK_MAP.get(d['loan_type'], 0.5)
+    d['midnight_app_flag'] = 1 if 0 <= pd.to_datetime(d['application_date']).hour <= 5 else 0
+    d['previous_application_count'] = 1
+
+    def vector(order, scaler):
+        vals = [d.get(f, 0) for f in order]
+        vals = [0 if pd.isna(v) or np.isinf(v) else v for v in vals]
+        return scaler.transform(np.array([vals], dtype=np.float64))[0]
+
+    return d, vector(SETTINGS.RISK_VECTOR_FEATURES, risk_scaler), vector(SETTINGS.FRAUD_VECTOR_FEATURES, fraud_scaler)
+
+
+def _same(x, y):
+    try:
+        fx, fy = float(x), float(y)
+    except (TypeError, ValueError):
+        return x == y
+    if math.isnan(fx) or math.isnan(fy):
+        return math.isnan(fx) and math.isnan(fy)
+    return math.isclose(fx, fy, rel_tol=1e-9, abs_tol=1e-9)
+
+
+@pytest.fixture(scope="module")
+def scalers(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    paths = []
+    for name, features in (("risk", SETTINGS.RISK_VECTOR_FEATURES), ("fraud", SETTINGS.FRAUD_VECTOR_FEATURES)):
+        path = tmp_path_factory.mktemp("models") / f"{name}_scaler.joblib"
+        joblib.dump(MinMaxScaler().fit(rng.uniform(0, 1000, size=(200, len(features)))), path)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture(scope="module")
+def engine(scalers):
+    return FeatureEngine(*scalers)
+
+
+@pytest.fixture(scope="module")
+def requests():
+    loans = pd.read_csv(SAMPLE_DATA / "loan_applications.csv", keep_default_na=False, nrows=N_APPLICATIONS)
+    txs = pd.read_csv(SAMPLE_DATA / "transactions.csv", keep_default_na=False, nrows=4000)
+    tx_rows = txs[list(TransactionInput.model_fields)].to_dict("records")
+
+    built, start = [], 0
+    for i, loan in enumerate(loans[list(LoanApplicationInput.model_fields)].to_dict("records")):
+        if i % 3 == 0: # Timestamped application dates exercise the midnight flag
+            loan['application_date'] += ' 03:15:00' if i % 2 else ' 14:00:00'
+        size = i % 13 # 0 (fallback branch), 1 (undefined std) ... 12 rows
+        rows = [dict(r) for r in tx_rows[start:start + size]]
+        start += size
+        if i % 7 == 1 and rows: # Device outside the schema: still counted by its raw name
+            rows[0]['device_used'] = 'Smartwatch'
+        built.append((loan, rows))
+    return built
+
+
+def test_matches_pandas_baseline(engine, requests):
+    ips = sorted({tx['ip_address'] for _, rows in requests for tx in rows})
+    dense_maps = ({ip: (i % 7) + 1 for i, ip in enumerate(ips[::2])}, {'Web': 3, 'ATM': 1, 'Mobile': 5})
+
+    mismatches, checked = [], 0
+    for loan, rows in requests:
+        request = PipelineRequestFast(application=loan, transactions=rows)
+        for ip_map, dev_map in (({}, {}), dense_maps):
+            fs = engine.create_feature_set(request, ip_map, dev_map)
+            ref, ref_risk, ref_fraud = _pandas_reference(
+                request.application.model_dump(), rows, ip_map, dev_map, engine.risk_scaler, engine.fraud_scaler
+            )
+            checked += 1
+            for key, value in ref.items():
+                if key not in fs.all_features or not _same(fs.all_features[key], value):
+                    mismatches.append((loan['application_id'], key, fs.all_features.get(key), value))
+            for name, got, want in (("risk_vector", fs.risk_vector, ref_risk), ("fraud_vector", fs.fraud_vector, ref_fraud)):
+                if not np.allclose(got, want, rtol=1e-5, atol=1e-5):
+                    mismatches.append((loan['application_id'], name, np.abs(np.array(got) - want).max(), 0))
+
+    assert checked == 2 * N_APPLICATIONS
+    assert mismatches == []
+
+
+@pytest.mark.parametrize("field, value", [
+    ("transaction_notes", None),
+    ("transaction_amount", "n/a"),
+    ("account_balance_after_transaction", [1, 2]),
+])
+def test_malformed_rows_raise_invalid_transactions(engine, requests, field, value):
+    loan, rows = next((loan, rows) for loan, rows in requests if rows)
+    bad = [dict(rows[0], **{field: value})] + rows[1:]
+    with pytest.raises(InvalidTransactionsError):
+        engine.create_feature_set(PipelineRequestFast(application=loan, transactions=bad), {}, {})
+
+
+@pytest.mark.parametrize("missing", [None, ""])
+def test_rows_without_a_date_match_the_baseline(engine, requests, missing):
+    # Not malformed for the engine: like pandas, an undated row counts as a transaction but spans no month
+    loan, rows = next((loan, rows) for loan, rows in requests if len(rows) >= 4)
+    rows = [dict(rows[0], transaction_date=missing), dict(rows[1], transaction_date=missing)] + rows[2:]
+    for transactions in (rows, rows[:2]): # Some dated rows left / none at all
+        request = PipelineRequestFast(application=loan, transactions=transactions)
+        fs = engine.create_feature_set(request, {}, {})
+        ref, _, _ = _pandas_reference(request.application.model_dump(), transactions, {}, {}, engine.risk_scaler, engine.fraud_scaler)
+        for key in ('total_monthly_burn_rate', 'transaction_frequency', 'ip_stability_ratio', 'cash_flow_coverage_ratio'):
+            assert _same(fs.all_features[key], ref[key]), key
+
+
+def test_missing_field_raises_invalid_transactions(engine, requests):
+    loan, rows = next((loan, rows) for loan, rows in requests if rows)
+    bad = {k: v for k, v in rows[0].items() if k != 'ip_address'}
+    with pytest.raises(InvalidTransactionsError):
+        engine.create_feature_set(PipelineRequestFast(application=loan, transactions=[bad]), {}, {})
+
+
+def test_unseen_devices_are_counted_by_raw_name(engine, requests):
+    loan, rows = next((loan, rows) for loan, rows in requests if len(rows) >= 3)
+    rows = [dict(rows[0], device_used='Web'), dict(rows[1], device_used='Smartwatch'), dict(rows[2], device_used='Tablet')]
+    fs = engine.create_feature_set(PipelineRequestFast(application=loan, transactions=rows), {}, {})
+    assert fs.all_features['unique_devices'] == fs.all_features['device_diversity_score'] == 3
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.llm_service import LLMService, _SUGGESTIONS_MAX_CHARS
+
+DECISION = (
+    "FINAL_STATUS: APPROVED\n"
+    "CONFIDENCE_LEVEL: 88%\n"
+    "EXPLANATION: Twins with matching spend were approved.\n"
+)
+
+
+def _end(text):
+    end = LLMService._decision_end(text)
+    return None if end < 0 else text[:end].strip()
+
+
+def test_incomplete_until_suggestions():
+    assert _end(DECISION) is None
+    assert _end(DECISION + "SUGGESTIONS:\n- Verify payslips\n") is None
+
+
+def test_stops_at_first_line_after_the_list():
+    block = DECISION + "SUGGESTIONS:\n- Verify payslips\n- Call employer\n"
+    assert _end(block + "\nNote: this is advisory only.\n") == block.strip()
+
+
+def test_blank_lines_between_suggestions_are_kept():
+    block = (
+        DECISION
+        + "SUGGESTIONS:\n\n"
+        + "1. Verify payslips\n\n"
+        + "2. Call employer\n\n\n"
+        + "- Check the device history\n"
+    )
+    assert _end(block) is None # More items may still follow
+    assert _end(block + "\nThat concludes the review.") == block.strip()
+
+
+def test_inline_and_continuation_lines_are_kept():
+    block = DECISION + "SUGGESTIONS: Verify payslips\n  against the bank statement\n* Call employer\n"
+    assert _end(block + "Done.\n") == block.strip()
+
+
+def test_size_cap_ends_a_runaway_list():
+    text = DECISION + "SUGGESTIONS:\n" + "- more\n" * (_SUGGESTIONS_MAX_CHARS // 4)
+    end = LLMService._decision_end(text)
+    assert end == text.index("SUGGESTIONS:") + len("SUGGESTIONS:") + _SUGGESTIONS_MAX_CHARS
+
+
+class _FakeStream:
+    def __init__(self, deltas):
+        self._chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))]) for d in deltas]
+        self.closed = False
+        self.consumed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.consumed == len(self._chunks):
+            raise StopAsyncIteration
+        self.consumed += 1
+        return self._chunks[self.consumed - 1]
+
+    async def close(self):
+        self.closed = True
+
+
+def test_read_decision_closes_the_stream_once_complete():
+    stream = _FakeStream([DECISION, "SUGGESTIONS:\n\n- Verify payslips\n\n", "- Call employer\n", "\nThanks", "!", " unused"])
+    text = asyncio.run(LLMService.__new__(LLMService)._read_decision(stream))
+    assert text == (DECISION + "SUGGESTIONS:\n\n- Verify payslips\n\n- Call employer").strip()
+    assert stream.closed
+    assert stream.consumed == 4
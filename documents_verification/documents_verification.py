@@ -1,42 +1,211 @@
 import os
-import json
+import orjson
 import re
+import math
+import random
+import hashlib
+import threading
 import uuid
-import google.generativeai as genai
 import io
-import numpy as np
-import tempfile
+import asyncio
+import functools
+import concurrent.futures
 from enum import Enum
-from typing import List, Dict, Any, Optional, Type, Union
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, BinaryIO, List, Dict, Any, Optional, Tuple, Type, Union
 from pydantic import BaseModel, Field, create_model
 from PIL import Image
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, utils as fuzz_utils
 from datetime import datetime
 from fastapi import FastAPI, File, UploadFile, HTTPException, Body
-from collections import Counter
-from qdrant_client import QdrantClient
-from fastembed import ImageEmbedding
+from fastapi.responses import JSONResponse
 
+# numpy, qdrant_client, fastembed/onnxruntime and google.generativeai are imported by the
+# classes that need them, so workers serving only /cross-validate never load CLIP or Gemini
+if TYPE_CHECKING:
+    import numpy as np
+
+# Only the payload keys _summarize reads come back with each of the 20 matches
+_SUMMARY_PAYLOAD = ["side", "filename"]
+
+# CLIP ViT-B/32 input edge; fastembed resizes the short side to it (bicubic) then center-crops
+CLIP_INPUT_SIZE = 224
+CLIP_EMBEDDING_DIM = 512
 
 class IDCardVerifier:
-    def __init__(self, url, api_key, collection_name="id_verification_system", threshold=0.80):
-        self.qc = QdrantClient(url=url, api_key=api_key)
-        self.model = ImageEmbedding(model_name="Qdrant/clip-ViT-B-32-vision")
+    def __init__(self, url, api_key, collection_name="id_verification_system", threshold=0.80, cache_size=1024):
+        from cachetools import LRUCache
+        from qdrant_client import QdrantClient, models
+        from fastembed import ImageEmbedding
+        import onnxruntime as ort
+
+        # gRPC: one multiplexed HTTP/2 channel per process instead of a TLS handshake per burst
+        self.qc = QdrantClient(url=url, api_key=api_key, prefer_grpc=True, timeout=30)
+        # Loaded once; on GPU one host thread just feeds CUDA, on CPU the intra-op pool gets every core
+        on_gpu = "CUDAExecutionProvider" in ort.get_available_providers()
+        providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if on_gpu else ["CPUExecutionProvider"]
+        self.model = ImageEmbedding(
+            model_name="Qdrant/clip-ViT-B-32-vision",
+            providers=providers,
+            threads=1 if on_gpu else os.cpu_count()
+        )
         self.collection_name = collection_name
         self.threshold = threshold
+        # Binary-quantized collection: oversample, then rescore on the full vectors so
+        # avg_score (and the threshold) stays on the original cosine scale
+        self.search_params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+        )
+        # Re-uploads (client retries, support flows) skip CLIP and Qdrant: verdicts keyed by image content.
+        # predict_batch runs in worker threads, hence the lock
+        self._cache = LRUCache(maxsize=cache_size)
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # Dedicated pool for apredict_batch: one CPU inference already fans out over every core,
+        # so a few workers are enough to overlap embeds with other requests' Qdrant round-trips
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="id-verifier"
+        )
+
+    def ensure_quantization(self) -> bool:
+        """
+        Enables binary quantization (always in RAM) on the ID collection if it has none yet.
+        Collections built before QdrantIDCard.ipynb created them quantized get it here on first use;
+        otherwise only the config is read, so worker restarts never trigger an optimizer rebuild.
+        """
+        from qdrant_client import models
+        try:
+            if self.qc.get_collection(self.collection_name).config.quantization_config is not None:
+                return True
+            self.qc.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+            )
+            return True
+        except Exception as e:
+            print(f"Qdrant Quantization Error: {e}")
+            return False
+
+    def predict(self, image: Union[str, bytes, Image.Image, "np.ndarray"]):
+        return self.predict_batch([image])[0]
+
+    def predict_from_bytes(self, img_bytes: bytes):
+        """Raw upload content (JPEG/PNG bytes), decoded in memory: no temp file"""
+        return self.predict_batch([img_bytes])[0]
+
+    async def apredict_batch(self, images: List[Union[str, bytes, Image.Image, "np.ndarray"]]) -> List[dict]:
+        """predict_batch off the event loop (CLIP inference and the Qdrant call both block)"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.predict_batch, images)
+
+    def predict_batch(self, images: List[Union[str, bytes, Image.Image, "np.ndarray"]]) -> List[dict]:
+        """
+        One embed() call and one batched Qdrant query for all images (results in input order).
+        Accepts file paths, raw image bytes or already-decoded images, so uploads never touch the disk.
+        """
+        # Raw bytes are keyed before decoding, so a hit skips the decode too; decoded images are keyed
+        # on their CLIP-ready reduction (a few hundred KB) rather than the full photo
+        keys, prepared = [], {}
+        for i, im in enumerate(images):
+            if isinstance(im, str): # Paths are not cached: the file may change under the same name
+                keys.append(None)
+            elif isinstance(im, bytes):
+                keys.append(self._digest(im))
+            else:
+                # Anything that is neither a path, bytes nor a PIL image is an array (checked without importing numpy)
+                prepared[i] = self._clip_ready(im if isinstance(im, Image.Image) else Image.fromarray(im))
+                keys.append(self._digest(str(prepared[i].size).encode(), prepared[i].tobytes()))
+        results = [
+            {"status": "error", "message": f"File '{im}' not found."} if isinstance(im, str) else None
+            for im in images
+        ]
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key) if key is not None else None
+                if cached is not None:
+                    results[i] = dict(cached)
+            cache_hits = sum(1 for k, r in zip(keys, results) if k is not None and r is not None)
+            self._cache_hits += cache_hits
+            self._cache_misses += sum(1 for k in keys if k is not None) - cache_hits
+        found = [
+            i for i, im in enumerate(images)
+            if (keys[i] is None or results[i] is None) and (not isinstance(im, str) or os.path.exists(im))
+        ]
+        if not found:
+            return results
+        from qdrant_client import models
+        vectors = self._embed([
+            prepared[i] if i in prepared
+            else self._clip_ready(Image.open(io.BytesIO(images[i]))) if isinstance(images[i], bytes)
+            else images[i]
+            for i in found
+        ])
+        responses = self.qc.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[models.QueryRequest(query=v.tolist(), limit=20, params=self.search_params, with_payload=_SUMMARY_PAYLOAD) for v in vectors]
+        )
+        for i, response in zip(found, responses):
+            results[i] = self._summarize(response.points)
+        with self._cache_lock:
+            for i in found:
+                if keys[i] is not None:
+                    self._cache[keys[i]] = dict(results[i])
+        return results
+
+    def embed_many(self, images: List[Union[str, Image.Image]]) -> "np.ndarray":
+        """(N, 512) CLIP vectors from a single ONNX run (fastembed would otherwise split at 16 images)"""
+        return self._embed([self._clip_ready(im) for im in images])
+
+    def _embed(self, images: List[Union[str, Image.Image]]) -> "np.ndarray":
+        import numpy as np
+        if not images: # np.stack([]) raises, and fastembed would get batch_size=0
+            return np.empty((0, CLIP_EMBEDDING_DIM), np.float32)
+        return np.stack(list(self.model.embed(images, batch_size=len(images))))
+
+    @staticmethod
+    def _clip_ready(image):
+        """
+        Resizes decoded images to fastembed's own CLIP target (short side 224, bicubic, same int
+        rounding) so its resize step is a plain copy and only crop + normalize remain. Large photos
+        are box-reduced first, keeping a short side of at least 2x the input for the bicubic pass.
+        """
+        if not isinstance(image, Image.Image):
+            return image
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        factor = min(image.size) // (2 * CLIP_INPUT_SIZE)
+        if factor > 1:
+            image = image.reduce(factor)
+        width, height = image.size
+        if width <= height:
+            size = (CLIP_INPUT_SIZE, int(CLIP_INPUT_SIZE * height / width))
+        else:
+            size = (int(CLIP_INPUT_SIZE * width / height), CLIP_INPUT_SIZE)
+        return image.resize(size, Image.Resampling.BICUBIC)
 
-    def predict(self, image_path):
-        if not os.path.exists(image_path):
-            return {"status": "error", "message": f"File '{image_path}' not found."}
-        query_vector = list(self.model.embed([image_path]))[0].tolist()
-        response = self.qc.query_points(collection_name=self.collection_name, query=query_vector, limit=20)
-        points = response.points
+    @staticmethod
+    def _digest(*parts: bytes) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            h.update(part)
+        return h.digest()
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return {"hits": self._cache_hits, "misses": self._cache_misses, "size": len(self._cache), "maxsize": self._cache.maxsize}
+
+    def _summarize(self, points) -> dict:
         if not points:
             return {"is_valid": False, "verdict": "not valid", "side": "unknown", "avg_score": 0.0}
-        scores = [res.score for res in points]
-        avg_score = np.mean(scores)
-        sides = [res.payload.get('side', 'unknown') for res in points]
-        most_common_side = Counter(sides).most_common(1)[0][0]
+        # Single pass: score total + side tally (first side wins ties, like Counter.most_common)
+        total = 0.0
+        side_counts = {}
+        for res in points:
+            total += res.score
+            side = res.payload.get('side', 'unknown')
+            side_counts[side] = side_counts.get(side, 0) + 1
+        avg_score = total / len(points)
+        most_common_side = max(side_counts.items(), key=lambda x: x[1])[0]
         return {
             "is_valid": avg_score >= self.threshold,
             "verdict": "valid" if avg_score >= self.threshold else "not valid",
@@ -89,6 +258,25 @@ class SchemaFactory:
             confidence_score: float
         return FinalResponse
 
+    @staticmethod
+    def get_cached(doc_info: Dict[str, Any]) -> Tuple[Type[BaseModel], str]:
+        """(ResponseModel, schema JSON) built once per document definition"""
+        return SchemaFactory._build_cached(
+            doc_info['document_name_latin'],
+            tuple(doc_info['extracted_fields']),
+            tuple(doc_info['cross_validation_anchors'])
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _build_cached(doc_name: str, extracted_fields: Tuple[str, ...], anchors: Tuple[str, ...]) -> Tuple[Type[BaseModel], str]:
+        model = SchemaFactory.create_response_model({
+            'document_name_latin': doc_name,
+            'extracted_fields': extracted_fields,
+            'cross_validation_anchors': anchors
+        })
+        return model, orjson.dumps(model.model_json_schema()).decode() # Compact: indentation is only prompt tokens
+
 class PromptEngine:
     @staticmethod
     def build_prompt(doc_info: Dict[str, Any], schema_json: str, image_count: int) -> str:
@@ -113,54 +301,179 @@ class PromptEngine:
     {schema_json}
     """
 
+# Gemini usually wraps its JSON in a ```json (sometimes bare ```) fence
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+
+# Longest image edge sent to Gemini unless the document config sets "max_image_edge"
+DEFAULT_MAX_IMAGE_EDGE = 1600
+
+# Gemini free/standard tiers throttle bursts: cap in-flight calls, back off on 429 (1s, 2s, 4s + jitter)
+GEMINI_MAX_CONCURRENCY = 4
+GEMINI_MAX_RETRIES = 3
+
 class LoanUnderwriter:
-    def __init__(self, config_json: str, api_key: str):
+    def __init__(self, config_json: Union[str, bytes], api_key: str, max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        import google.generativeai as genai
+        from google.api_core.exceptions import ResourceExhausted
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel("gemini-2.0-flash")
-        self.config = json.loads(config_json)
+        self._rate_limited = ResourceExhausted
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.config = orjson.loads(config_json)
         self.registry = {doc['document_name_latin']: doc for doc in self.config['documents']}
+        # Every (response model, schema JSON) is built here; requests only do a dict lookup
+        self._schemas = {name: SchemaFactory.get_cached(doc) for name, doc in self.registry.items()}
 
     def _clean_json(self, text: str) -> str:
-        match = re.search(r"```json\s*(.*?)\s*```", text, re.DOTALL)
-        return match.group(1) if match else text.strip()
+        stripped = text.strip()
+        if stripped.startswith('{'): # Bare JSON: no fence to look for
+            return stripped
+        match = _JSON_FENCE.search(text)
+        return match.group(1) if match else stripped
 
-    def process(self, doc_type: DocumentType, images: List[Image.Image]):
+    @staticmethod
+    def _resize(image: Image.Image, max_edge: int) -> Image.Image:
+        """RGB copy no larger than max_edge (Gemini cost/latency scale with pixel tiles); never mutates the input"""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        width, height = image.size
+        if max(width, height) <= max_edge:
+            return image
+        scale = max_edge / max(width, height)
+        return image.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            Image.Resampling.LANCZOS,
+            reducing_gap=3.0
+        )
+
+    def max_image_edge(self, doc_type: DocumentType) -> int:
+        return self.registry.get(doc_type.value).get('max_image_edge', DEFAULT_MAX_IMAGE_EDGE)
+
+    def _build_request(self, doc_type: DocumentType, images: List[Image.Image]):
         doc_info = self.registry.get(doc_type.value)
-        ResponseModel = SchemaFactory.create_response_model(doc_info)
-        prompt = PromptEngine.build_prompt(doc_info, json.dumps(ResponseModel.model_json_schema(), indent=2), len(images))
-        content = [prompt] + images
+        max_edge = self.max_image_edge(doc_type)
+        images = [self._resize(im, max_edge) for im in images]
+        ResponseModel, schema_json = self._schemas[doc_type.value]
+        prompt = PromptEngine.build_prompt(doc_info, schema_json, len(images))
+        return ResponseModel, [prompt] + images
+
+    def process(self, doc_type: DocumentType, images: List[Image.Image]):
+        ResponseModel, content = self._build_request(doc_type, images)
         response = self.model.generate_content(content)
         return ResponseModel.model_validate_json(self._clean_json(response.text))
 
+    async def process_async(self, doc_type: DocumentType, images: List[Image.Image]):
+        """Same as process(), without blocking the event loop (lets documents run concurrently)"""
+        ResponseModel, content = self._build_request(doc_type, images)
+        async with self._slots:
+            for attempt in range(GEMINI_MAX_RETRIES + 1):
+                try:
+                    response = await self.model.generate_content_async(content)
+                    break
+                except self._rate_limited:
+                    if attempt == GEMINI_MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(2 ** attempt + random.random())
+        return ResponseModel.model_validate_json(self._clean_json(response.text))
+
 class CrossValidationEngine:
     def __init__(self):
         self.issues: List[ValidationIssue] = []
 
     def _fuzzy_match(self, str1: str, str2: str) -> float:
         if not str1 or not str2: return 0.0
-        return SequenceMatcher(None, str1.upper(), str2.upper()).ratio()
-
-    def run_pipeline(self, results: Dict[DocumentType, Any], qdrant_id_val: Optional[Dict[str, Any]], skip_national_id_llm: bool):
+        # C implementation; default_process case-folds, strips punctuation and trims in one go
+        return fuzz.ratio(str1, str2, processor=fuzz_utils.default_process) / 100.0
+
+    async def extract_one(self, underwriter: LoanUnderwriter, doc_type: DocumentType, images: List[Image.Image]) -> Optional[Any]:
+        """One document's extraction, or None with a HIGH issue recorded if Gemini/validation failed"""
+        try:
+            return await underwriter.process_async(doc_type, images)
+        except Exception as e:
+            self.issues.append(ValidationIssue(field=doc_type.value, message=f"Extraction failed: {e}", severity="HIGH", score=0.0))
+            return None
+
+    def run_pipeline(self, results: Dict[DocumentType, Any], qdrant_id_val: Optional[Dict[str, Any]], skip_national_id_llm: bool, fast_fail: bool = False):
         fraud_detected = False
         if skip_national_id_llm:
             self.issues.append(ValidationIssue(field="National ID Card", message="Failed Qdrant visual verification", severity="CRITICAL", score=0.0))
             fraud_detected = True
+            if fast_fail: # Already a guaranteed rejection: no name matching
+                return self._build_report(fraud_detected, 0.0, self.issues, qdrant_id_val)
         
         name_score = 0.0
         if DocumentType.NATIONAL_ID in results and DocumentType.SALARY_SLIP in results:
-            id_data = results[DocumentType.NATIONAL_ID].extracted_data
-            id_name = f"{id_data.first_name} {id_data.last_name}"
-            salary_name = getattr(results[DocumentType.SALARY_SLIP].cross_validation_anchors, 'full_name', "")
+            id_name = self._id_full_name(results[DocumentType.NATIONAL_ID].extracted_data)
+            salary_name = getattr(results[DocumentType.SALARY_SLIP].cross_validation_anchors, 'full_name', None) or ""
             name_score = self._fuzzy_match(id_name, salary_name)
             if name_score < 0.85:
                 fraud_detected = True
 
-        decision = "Rejected" if fraud_detected else ("Flagged" if len(self.issues) > 0 else "Verified")
+        return self._build_report(fraud_detected, name_score, self.issues, qdrant_id_val)
+
+    def run_pipeline_batch(
+        self,
+        results_list: List[Dict[DocumentType, Any]],
+        qdrant_id_vals: Optional[List[Optional[Dict[str, Any]]]] = None,
+        skip_flags: Optional[List[bool]] = None,
+        fast_fail: bool = False
+    ) -> List[CrossValidationReport]:
+        """
+        run_pipeline for many applicant packs at once (same rules, one report per pack).
+        Names are gathered column-wise and every ID/salary pair is scored by a single
+        rapidfuzz cpdist call instead of one Python-level match per applicant.
+        """
+        from rapidfuzz import process
+
+        n = len(results_list)
+        qdrant_id_vals = qdrant_id_vals or [None] * n
+        skip_flags = skip_flags or [False] * n
+
+        has_pair = [False] * n
+        name_scores = [0.0] * n
+        pair_idx, id_names, salary_names = [], [], []
+        for i, results in enumerate(results_list):
+            if skip_flags[i] and fast_fail:
+                continue
+            if DocumentType.NATIONAL_ID in results and DocumentType.SALARY_SLIP in results:
+                has_pair[i] = True
+                id_name = self._id_full_name(results[DocumentType.NATIONAL_ID].extracted_data)
+                salary_name = getattr(results[DocumentType.SALARY_SLIP].cross_validation_anchors, 'full_name', None) or ""
+                if id_name and salary_name: # Empty names score 0.0, as in _fuzzy_match
+                    pair_idx.append(i)
+                    id_names.append(id_name)
+                    salary_names.append(salary_name)
+
+        if pair_idx:
+            scores = process.cpdist(
+                id_names, salary_names,
+                scorer=fuzz.ratio, processor=fuzz_utils.default_process, dtype="float64", workers=-1
+            )
+            for i, score in zip(pair_idx, (scores / 100.0).tolist()):
+                name_scores[i] = score
+
+        reports = []
+        for i in range(n):
+            issues = []
+            if skip_flags[i]:
+                issues.append(ValidationIssue(field="National ID Card", message="Failed Qdrant visual verification", severity="CRITICAL", score=0.0))
+            fraud_detected = skip_flags[i] or (has_pair[i] and name_scores[i] < 0.85)
+            reports.append(self._build_report(fraud_detected, name_scores[i], issues, qdrant_id_vals[i]))
+        return reports
+
+    @staticmethod
+    def _id_full_name(id_data) -> str:
+        """'First Last' from the parts Gemini actually extracted ('' if none, never 'None None')"""
+        return " ".join(p for p in (getattr(id_data, 'first_name', None), getattr(id_data, 'last_name', None)) if p)
+
+    @staticmethod
+    def _build_report(fraud_detected: bool, name_score: float, issues: List[ValidationIssue], qdrant_id_val: Optional[Dict[str, Any]]) -> CrossValidationReport:
+        decision = "Rejected" if fraud_detected else ("Flagged" if len(issues) > 0 else "Verified")
         return CrossValidationReport(
             overall_fraud_flag=fraud_detected,
             identity_score=name_score,
             income_match_flag=True,
-            issues=self.issues,
+            issues=issues,
             final_decision=decision,
             qdrant_id_validation=qdrant_id_val
         )
@@ -173,7 +486,7 @@ class DataMapper:
 
         return {
             "application_id": str(uuid.uuid4()),
-            "customer_id": getattr(trans_data, 'customer_id', None) or (id_data.id_number if id_data else None),
+            "customer_id": getattr(trans_data, 'customer_id', None) or getattr(id_data, 'id_number', None),
             "application_date": datetime.now().strftime("%Y-%m-%d"),
             "recent_transaction_amount": getattr(trans_data, 'transaction_amount', None),
             "recent_merchant": getattr(trans_data, 'merchant_name', None),
@@ -182,89 +495,227 @@ class DataMapper:
         }
 
 
-app = FastAPI(title="Loan Document Underwriting API")
+class FastJSONResponse(JSONResponse):
+    """
+    orjson rendering (C, NumPy-aware). Endpoints that build plain dicts return it directly,
+    which also skips FastAPI's pure-Python jsonable_encoder walk over the nested report.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+app = FastAPI(title="Loan Document Underwriting API", default_response_class=FastJSONResponse)
 
 CONFIG = {"documents": [
     {"document_name_latin": "National ID Card", "extracted_fields": ["first_name", "last_name", "id_number"], "cross_validation_anchors": ["id_number", "full_name"], "helper_text": "Identity."},
     {"document_name_latin": "Salary Slip / Certificate", "extracted_fields": ["monthly_income"], "cross_validation_anchors": ["full_name"], "helper_text": "Income."},
     {"document_name_latin": "Tax Declaration (DUR)", "document_name_arabic": "التصريح الوحيد بالدخل", "extracted_fields": ["number_of_dependents", "annual_taxable_income"], "cross_validation_anchors": ["full_name", "id_number"], "helper_text": "Legal dependents count."},
-    {"document_name_latin": "Bank Statements (6 Months)", "document_name_arabic": "كشوفات البنكي", "extracted_fields": ["existing_emis_monthly", "total_salary_credits"], "cross_validation_anchors": ["account_holder_name", "employer_name_in_transactions"], "helper_text": "Financial liabilities."},
+    {"document_name_latin": "Bank Statements (6 Months)", "document_name_arabic": "كشوفات البنكي", "extracted_fields": ["existing_emis_monthly", "total_salary_credits"], "cross_validation_anchors": ["account_holder_name", "employer_name_in_transactions"], "helper_text": "Financial liabilities.", "max_image_edge": 2048},
     {"document_name_latin": "Property Title / Utility Bill", "document_name_arabic": "شهادة ملكية", "extracted_fields": ["property_ownership_status", "residential_address"], "cross_validation_anchors": ["full_name", "residential_address"], "helper_text": "Residence status."},
-    {"document_name_latin": "Detailed Transaction History", "extracted_fields": ["transaction_id", "customer_id", "transaction_date", "transaction_type", "transaction_amount", "merchant_category", "merchant_name", "transaction_location", "account_balance_after_transaction", "is_international_transaction", "device_used", "ip_address", "transaction_status", "transaction_source_destination", "transaction_notes"], "cross_validation_anchors": ["customer_id", "transaction_id"], "helper_text": "Extract all transaction details."}
+    {"document_name_latin": "Detailed Transaction History", "extracted_fields": ["transaction_id", "customer_id", "transaction_date", "transaction_type", "transaction_amount", "merchant_category", "merchant_name", "transaction_location", "account_balance_after_transaction", "is_international_transaction", "device_used", "ip_address", "transaction_status", "transaction_source_destination", "transaction_notes"], "cross_validation_anchors": ["customer_id", "transaction_id"], "helper_text": "Extract all transaction details.", "max_image_edge": 2048}
 ]}
 
-verifier = IDCardVerifier(url="YOUR_URL", api_key="YOUR_KEY")
-underwriter = LoanUnderwriter(json.dumps(CONFIG), "YOUR_GEMINI_KEY")
-
-async def files_to_images(files: List[UploadFile]) -> List[Image.Image]:
-    images = []
-    for file in files:
-        content = await file.read()
-        images.append(Image.open(io.BytesIO(content)))
-    return images
+@functools.cache
+def get_verifier() -> IDCardVerifier:
+    """Built on first use (loads the CLIP model, opens the Qdrant client, checks quantization)"""
+    verifier = IDCardVerifier(url="YOUR_URL", api_key="YOUR_KEY")
+    verifier.ensure_quantization()
+    return verifier
+
+@functools.cache
+def get_underwriter() -> LoanUnderwriter:
+    """Built on first use (imports and configures the Gemini SDK)"""
+    return LoanUnderwriter(orjson.dumps(CONFIG), "YOUR_GEMINI_KEY")
+
+# Above this many uploads, JPEG decoding is spread over the default thread pool (libjpeg releases the GIL)
+THREADED_DECODE_MIN_FILES = 4
+
+# Starlette spools uploads above 1 MiB to a temp file; those are decoded straight from it
+STREAM_DECODE_MIN_BYTES = 1 << 20
+
+def _decode_image(content: Union[bytes, BinaryIO], max_edge: Optional[int] = None) -> Image.Image:
+    image = Image.open(io.BytesIO(content) if isinstance(content, bytes) else content)
+    if max_edge:
+        # JPEG only: libjpeg decodes at 1/2, 1/4 or 1/8 scale directly, keeping the long edge >= max_edge
+        width, height = image.size
+        scale = max_edge / max(width, height)
+        if scale < 1:
+            image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+    image.load()
+    return image
+
+async def _upload_source(file: UploadFile) -> Union[bytes, BinaryIO]:
+    """Small uploads as bytes; large ones as their spooled file, so PIL reads chunks instead of one heap copy"""
+    if file.size is not None and file.size > STREAM_DECODE_MIN_BYTES:
+        await file.seek(0)
+        return file.file
+    return await file.read()
+
+async def files_to_images(files: List[UploadFile], max_edge: Optional[int] = None, threaded: Optional[bool] = None) -> List[Image.Image]:
+    """
+    Decoded uploads; with max_edge, JPEGs are decoded at a reduced scale that _resize then finishes.
+    threaded defaults to "more than THREADED_DECODE_MIN_FILES uploads"; callers decoding several
+    groups at once pass the decision for the whole submission.
+    """
+    contents = await asyncio.gather(*(_upload_source(file) for file in files))
+    if threaded is None:
+        threaded = len(contents) > THREADED_DECODE_MIN_FILES
+    if threaded:
+        return list(await asyncio.gather(*(asyncio.to_thread(_decode_image, c, max_edge) for c in contents)))
+    return [_decode_image(c, max_edge) for c in contents]
 
 
 @app.post("/extract/national-id")
 async def extract_national_id(files: List[UploadFile] = File(...)):
     try:
-        qdrant_results = []
-        is_invalid_qdrant = False
-        for f in files:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-                content = await f.read()
-                tmp.write(content)
-                tmp_path = tmp.name
-            await f.seek(0)
-            res = verifier.predict(tmp_path)
-            qdrant_results.append(res)
-            if not res["is_valid"]: is_invalid_qdrant = True
-            os.unlink(tmp_path)
+        # Each upload is read and decoded once, then shared by Qdrant and Gemini
+        images = await files_to_images(files, get_underwriter().max_image_edge(DocumentType.NATIONAL_ID))
+        qdrant_results = await get_verifier().apredict_batch(images)
+        is_invalid_qdrant = any(not res.get("is_valid", False) for res in qdrant_results)
         
-        images = await files_to_images(files)
-        extraction = underwriter.process(DocumentType.NATIONAL_ID, images)
-        return {"extraction": extraction.dict(), "qdrant_validation": qdrant_results, "failed_visual_check": is_invalid_qdrant}
+        extraction = get_underwriter().process(DocumentType.NATIONAL_ID, images)
+        return FastJSONResponse({"extraction": extraction.model_dump(mode="json"), "qdrant_validation": qdrant_results, "failed_visual_check": is_invalid_qdrant})
     except Exception as e: raise HTTPException(500, detail=str(e))
 
 @app.post("/extract/salary-slip")
 async def extract_salary_slip(files: List[UploadFile] = File(...)):
-    images = await files_to_images(files)
+    underwriter = get_underwriter()
+    images = await files_to_images(files, underwriter.max_image_edge(DocumentType.SALARY_SLIP))
     return underwriter.process(DocumentType.SALARY_SLIP, images)
 
 @app.post("/extract/tax-declaration")
 async def extract_tax_declaration(files: List[UploadFile] = File(...)):
-    images = await files_to_images(files)
+    underwriter = get_underwriter()
+    images = await files_to_images(files, underwriter.max_image_edge(DocumentType.TAX_DECLARATION))
     return underwriter.process(DocumentType.TAX_DECLARATION, images)
 
 @app.post("/extract/bank-statement")
 async def extract_bank_statement(files: List[UploadFile] = File(...)):
-    images = await files_to_images(files)
+    underwriter = get_underwriter()
+    images = await files_to_images(files, underwriter.max_image_edge(DocumentType.BANK_STATEMENT))
     return underwriter.process(DocumentType.BANK_STATEMENT, images)
 
 @app.post("/extract/property-doc")
 async def extract_property_doc(files: List[UploadFile] = File(...)):
-    images = await files_to_images(files)
+    underwriter = get_underwriter()
+    images = await files_to_images(files, underwriter.max_image_edge(DocumentType.PROPERTY_DOC))
     return underwriter.process(DocumentType.PROPERTY_DOC, images)
 
 @app.post("/extract/bank-transactions")
 async def extract_bank_transactions(files: List[UploadFile] = File(...)):
-    images = await files_to_images(files)
+    underwriter = get_underwriter()
+    images = await files_to_images(files, underwriter.max_image_edge(DocumentType.BANK_TRANSACTIONS))
     return underwriter.process(DocumentType.BANK_TRANSACTIONS, images)
 
+async def _extract_submission(
+    groups: Dict[DocumentType, List[UploadFile]],
+    engine: "CrossValidationEngine",
+    fast_fail: bool = False
+) -> Tuple[Dict[DocumentType, Any], List[dict]]:
+    """
+    Per-document pipelines: every group decodes concurrently and its Gemini call starts as soon as
+    its own images are ready, while the ID's visual check runs alongside.
+    fast_fail: no Gemini call is sent until the ID passes its visual check; a failed check returns
+    no extractions (the pack is rejected anyway), so flagged packs cost one Qdrant query only.
+    """
+    underwriter = get_underwriter()
+    # Six small groups still add up: the whole submission's size decides whether decoding leaves the loop
+    threaded = sum(len(v) for v in groups.values()) > THREADED_DECODE_MIN_FILES
+    decoded = {
+        dt: asyncio.ensure_future(files_to_images(v, underwriter.max_image_edge(dt), threaded))
+        for dt, v in groups.items()
+    }
+
+    async def extract(doc_type: DocumentType):
+        # Each document's Gemini call starts as soon as its own images are decoded
+        try:
+            images = await decoded[doc_type]
+        except Exception as e: # Undecodable upload: flagged like a failed extraction
+            engine.issues.append(ValidationIssue(field=doc_type.value, message=f"Could not decode upload: {e}", severity="HIGH", score=0.0))
+            return None
+        return await engine.extract_one(underwriter, doc_type, images)
+
+    gated = fast_fail and DocumentType.NATIONAL_ID in groups
+    extractions = {} if gated else {dt: asyncio.ensure_future(extract(dt)) for dt in groups}
+    try:
+        # Ungated, the ID's visual check (sync Qdrant client) overlaps with the Gemini calls;
+        # all ID images share one embed() pass and one query_batch_points round-trip
+        qdrant_results = []
+        if DocumentType.NATIONAL_ID in groups:
+            try:
+                id_images = await decoded[DocumentType.NATIONAL_ID]
+            except Exception as e: # No visual check is possible: the client has to re-upload
+                raise HTTPException(400, detail=f"Could not decode {DocumentType.NATIONAL_ID.value} upload: {e}")
+            qdrant_results = await get_verifier().apredict_batch(id_images)
+        if gated:
+            if any(not res.get("is_valid", False) for res in qdrant_results):
+                return {}, qdrant_results # Nothing was sent to Gemini
+            extractions = {dt: asyncio.ensure_future(extract(dt)) for dt in groups}
+
+        outcomes = dict(zip(extractions, await asyncio.gather(*extractions.values())))
+        return {dt: outcomes[dt] for dt in groups if outcomes.get(dt) is not None}, qdrant_results
+    finally:
+        # Fast-fail (pending decodes) or a 400: nothing is left running (no-op for finished tasks)
+        for task in (*decoded.values(), *extractions.values()):
+            task.cancel()
+
+def _upload_groups(**uploads: Optional[List[UploadFile]]) -> Dict[DocumentType, List[UploadFile]]:
+    """Keyword per DocumentType member (lower-cased), empty fields dropped; 400 if nothing was sent"""
+    groups = {DocumentType[name.upper()]: files for name, files in uploads.items() if files}
+    if not groups:
+        raise HTTPException(400, detail="No documents uploaded")
+    return groups
+
+@app.post("/extract/all")
+async def extract_all(
+    national_id: Optional[List[UploadFile]] = File(None),
+    salary_slip: Optional[List[UploadFile]] = File(None),
+    tax_declaration: Optional[List[UploadFile]] = File(None),
+    bank_statement: Optional[List[UploadFile]] = File(None),
+    property_doc: Optional[List[UploadFile]] = File(None),
+    bank_transactions: Optional[List[UploadFile]] = File(None)
+):
+    """Full submission in one call: every document's Gemini extraction runs concurrently"""
+    try:
+        engine = CrossValidationEngine()
+        results, qdrant_results = await _extract_submission(_upload_groups(
+            national_id=national_id, salary_slip=salary_slip, tax_declaration=tax_declaration,
+            bank_statement=bank_statement, property_doc=property_doc, bank_transactions=bank_transactions
+        ), engine)
+        return FastJSONResponse({
+            "extractions": {dt.value: res.model_dump(mode="json") for dt, res in results.items()},
+            "errors": [issue.model_dump() for issue in engine.issues],
+            "qdrant_validation": qdrant_results,
+            "failed_visual_check": any(not res.get("is_valid", False) for res in qdrant_results)
+        })
+    except HTTPException: raise
+    except Exception as e: raise HTTPException(500, detail=str(e))
+
 
 class CrossValidationRequest(BaseModel):
     extraction_results: Dict[str, Any] 
     qdrant_validation_summary: Optional[Dict[str, Any]] = None
     failed_visual_check: bool = False
 
+def _to_processed_results(extraction_results: Dict[str, Any]) -> Dict[DocumentType, Any]:
+    processed_results = {}
+    for doc_name, data in extraction_results.items():
+        processed_results[DocumentType(doc_name)] = SimpleNamespace(
+            extracted_data=SimpleNamespace(**data.get('extracted_data', {})),
+            cross_validation_anchors=SimpleNamespace(**data.get('cross_validation_anchors', {}))
+        )
+    return processed_results
+
+def _cross_validation_response(report: CrossValidationReport, processed_results: Dict[DocumentType, Any]) -> Dict[str, Any]:
+    return {
+        "status": "success" if not report.overall_fraud_flag else "flagged",
+        "report": report.model_dump(mode="json"),
+        "data": DataMapper.to_dataset_row(processed_results)
+    }
+
 @app.post("/cross-validate")
 async def cross_validate(payload: CrossValidationRequest):
     try:
-        processed_results = {}
-        for doc_name, data in payload.extraction_results.items():
-            processed_results[DocumentType(doc_name)] = type('obj', (object,), {
-                'extracted_data': type('obj', (object,), data.get('extracted_data', {})),
-                'cross_validation_anchors': type('obj', (object,), data.get('cross_validation_anchors', {}))
-            })
+        processed_results = _to_processed_results(payload.extraction_results)
 
         engine = CrossValidationEngine()
         report = engine.run_pipeline(
@@ -273,9 +724,49 @@ async def cross_validate(payload: CrossValidationRequest):
             payload.failed_visual_check
         )
         
-        return {
-            "status": "success" if not report.overall_fraud_flag else "flagged",
-            "report": report.dict(),
-            "data": DataMapper.to_dataset_row(processed_results)
-        }
-    except Exception as e: raise HTTPException(500, detail=str(e))
\ No newline at end of file
+        return FastJSONResponse(_cross_validation_response(report, processed_results))
+    except Exception as e: raise HTTPException(500, detail=str(e))
+
+@app.post("/cross-validate/batch")
+async def cross_validate_batch(payloads: List[CrossValidationRequest]):
+    """Bulk /cross-validate: one response per applicant pack, same order"""
+    try:
+        processed = [_to_processed_results(p.extraction_results) for p in payloads]
+        reports = CrossValidationEngine().run_pipeline_batch(
+            processed,
+            [p.qdrant_validation_summary for p in payloads],
+            [p.failed_visual_check for p in payloads]
+        )
+        return FastJSONResponse([_cross_validation_response(r, pr) for r, pr in zip(reports, processed)])
+    except Exception as e: raise HTTPException(500, detail=str(e))
+
+@app.post("/validate")
+async def validate(
+    national_id: Optional[List[UploadFile]] = File(None),
+    salary_slip: Optional[List[UploadFile]] = File(None),
+    tax_declaration: Optional[List[UploadFile]] = File(None),
+    bank_statement: Optional[List[UploadFile]] = File(None),
+    property_doc: Optional[List[UploadFile]] = File(None),
+    bank_transactions: Optional[List[UploadFile]] = File(None),
+    fast_fail: bool = True
+):
+    """
+    End to end: /extract/all followed by /cross-validate, without the client round-trip in between.
+    With fast_fail (default), Gemini is only called once the ID has passed its visual check: an ID
+    that fails it is rejected without any extraction. fast_fail=false extracts every document for review.
+    """
+    try:
+        engine = CrossValidationEngine()
+        results, qdrant_results = await _extract_submission(_upload_groups(
+            national_id=national_id, salary_slip=salary_slip, tax_declaration=tax_declaration,
+            bank_statement=bank_statement, property_doc=property_doc, bank_transactions=bank_transactions
+        ), engine, fast_fail)
+        report = engine.run_pipeline(
+            results,
+            {"results": qdrant_results} if qdrant_results else None,
+            any(not res.get("is_valid", False) for res in qdrant_results),
+            fast_fail
+        )
+        return FastJSONResponse(_cross_validation_response(report, results))
+    except HTTPException: raise
+    except Exception as e: raise HTTPException(500, detail=str(e))